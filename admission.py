@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, List, Optional
+
+from astrbot.api import logger
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class AdmissionRejected(Exception):
+    """合成队列已满或预计等待时间过长，本次请求被拒绝"""
+
+
+class SynthesisAdmission:
+    """
+    插件级的合成准入控制。每个分块合成前需要获取一个名额，名额总数等于所有TTS服务器的并发数之和。
+    等待中的请求按优先级分组，同一优先级内在各会话之间轮流分配名额，避免单个长回复占满服务器。
+    队列过长或预计等待超过期限时拒绝新的回复，由调用方退回纯文本。
+    """
+
+    def __init__(
+        self, capacity_fn: Callable[[], int], max_queue: int = 64, max_wait_seconds: float = 60.0,
+        ewma_alpha: float = 0.2,
+    ):
+        """
+        :param capacity_fn: 返回当前总名额数的函数。
+        :param max_queue: 等待中的分块数上限。
+        :param max_wait_seconds: 预计排队时间超过该值时拒绝新的回复，<=0 表示不限制。
+        """
+        self.capacity_fn = capacity_fn
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.ewma_alpha = ewma_alpha
+        self._queues: List["OrderedDict[str, Deque[asyncio.Future]]"] = [OrderedDict(), OrderedDict()]
+        self._active = 0
+        self._hold_ewma: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+
+    def _capacity(self) -> int:
+        return max(1, self.capacity_fn())
+
+    def queued(self, priority: int = PRIORITY_NORMAL) -> int:
+        """优先级不低于 priority 的等待中分块数"""
+        return sum(
+            len(waiters) for queues in self._queues[:priority + 1] for waiters in queues.values()
+        )
+
+    def estimate_wait(self, priority: int = PRIORITY_NORMAL) -> float:
+        """估计新请求需要排队的时间（秒）"""
+        capacity = self._capacity()
+        ahead = self.queued(priority)
+        if self._active < capacity and ahead == 0:
+            return 0.0
+        rounds = (ahead + 1) / capacity
+        return rounds * (self._hold_ewma or 0.0)
+
+    def check(self, session_id: str, priority: int = PRIORITY_NORMAL):
+        """判断是否接受一条新的回复，不接受时抛出 AdmissionRejected"""
+        if self.queued(priority) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(f"合成队列已满 ({self.max_queue})")
+        wait = self.estimate_wait(priority)
+        if self.max_wait_seconds > 0 and wait > self.max_wait_seconds:
+            self.rejected += 1
+            raise AdmissionRejected(f"预计排队 {wait:.0f} 秒，超过上限 {self.max_wait_seconds:.0f} 秒")
+        self.admitted += 1
+        logger.debug(f"[{session_id}] 准入通过，预计排队 {wait:.1f} 秒。")
+
+    @asynccontextmanager
+    async def permit(self, session_id: str, priority: int = PRIORITY_NORMAL):
+        """获取一个合成名额，退出时归还"""
+        await self._acquire(session_id, priority)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_hold(time.monotonic() - start_time)
+            self._release()
+
+    async def _acquire(self, session_id: str, priority: int):
+        if self._active < self._capacity() and self.queued(PRIORITY_NORMAL) == 0:
+            self._active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        queues = self._queues[min(max(priority, PRIORITY_HIGH), PRIORITY_NORMAL)]
+        queues.setdefault(session_id, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已分配但调用方被取消，归还名额
+                self._release()
+            else:
+                waiters = queues.get(session_id)
+                if waiters and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del queues[session_id]
+            raise
+
+    def _record_hold(self, duration: float):
+        if self._hold_ewma is None:
+            self._hold_ewma = duration
+        else:
+            self._hold_ewma = self.ewma_alpha * duration + (1 - self.ewma_alpha) * self._hold_ewma
+
+    def _release(self):
+        self._active = max(0, self._active - 1)
+        self._dispatch()
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        """按优先级从高到低，在同一优先级的各会话之间轮流取出下一个等待者"""
+        for queues in self._queues:
+            while queues:
+                session_id, waiters = next(iter(queues.items()))
+                future = waiters.popleft()
+                if waiters:
+                    queues.move_to_end(session_id)
+                else:
+                    del queues[session_id]
+                if not future.done():
+                    return future
+        return None
+
+    def _dispatch(self):
+        while self._active < self._capacity():
+            future = self._next_waiter()
+            if future is None:
+                return
+            self._active += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "active": self._active,
+            "capacity": self._capacity(),
+            "queued_high": self.queued(PRIORITY_HIGH),
+            "queued_total": self.queued(PRIORITY_NORMAL),
+            "estimated_wait": self.estimate_wait(),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from astrbot.api import logger
+
+from .audio_io import AudioIOExecutor
+
+
+class AudioCache:
+    """
+    基于内容寻址的合成音频磁盘缓存。
+    键由角色、参考音频、最终文本和音频参数计算得出，文件按最近使用顺序淘汰，总大小和条目数均有上限。
+    文件的修改时间即为最近使用时间，因此重启后仍能恢复LRU顺序。
+    """
+
+    FILE_SUFFIX = ".wav"
+
+    def __init__(
+        self, cache_dir, max_bytes: int, max_entries: int = 0, io_executor: Optional[AudioIOExecutor] = None,
+    ):
+        """
+        :param cache_dir: 缓存目录。
+        :param max_bytes: 缓存总大小上限（字节），<=0 表示不限制。
+        :param max_entries: 缓存条目数上限，<=0 表示不限制。
+        :param io_executor: 可选，执行文件读写的线程池；为 None 时使用默认线程池。
+        """
+        self._run_io = io_executor.run if io_executor else asyncio.to_thread
+        self.cache_dir = os.path.abspath(str(cache_dir))
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(
+        character_name: str, ref_audio_path: str, ref_audio_text: str, text: str, audio_params: Dict,
+    ) -> str:
+        """根据合成输入计算缓存键"""
+        material = json.dumps(
+            [character_name, ref_audio_path, ref_audio_text, text, audio_params],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.FILE_SUFFIX)
+
+    def _load_index(self):
+        """扫描缓存目录，按修改时间重建LRU顺序，并清理残留的临时文件"""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.endswith(self.FILE_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name[: -len(self.FILE_SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        if found:
+            logger.info(f"音频缓存已加载 {len(self._entries)} 个条目，共 {self._total_bytes / 1024 / 1024:.1f} MB。")
+        self._remove_files(self._evict())
+
+    def owns(self, path: Optional[str]) -> bool:
+        """判断文件是否属于缓存目录（属于缓存的文件不能被调用方删除）"""
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == self.cache_dir
+
+    async def get(self, key: str) -> Optional[str]:
+        """查找缓存，命中时返回缓存文件路径并刷新其最近使用时间"""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+
+        path = self._path_for(key)
+        try:
+            await self._run_io(os.utime, path, None)
+        except OSError:
+            # 文件被外部删除，视为未命中
+            self._total_bytes -= self._entries.pop(key, 0)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    async def put(self, key: str, source_path: str) -> Optional[str]:
+        """将合成好的音频文件复制进缓存，返回缓存文件路径"""
+        return await self.put_with(key, lambda tmp_path: shutil.copyfile(source_path, tmp_path))
+
+    async def put_with(self, key: str, write: Callable[[str], None]) -> Optional[str]:
+        """在线程中调用 write(临时文件路径) 生成缓存内容，完成后原子地放入缓存，返回缓存文件路径"""
+        if key in self._entries:
+            return self._path_for(key)
+
+        path = self._path_for(key)
+        tmp_path = os.path.join(self.cache_dir, f"{uuid.uuid4().hex}.tmp")
+        try:
+            await self._run_io(write, tmp_path)
+            size = await self._run_io(self._commit, tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入音频缓存失败: {e}")
+            await self._run_io(self._remove_files, [tmp_path], False)
+            return None
+
+        self._entries[key] = size
+        self._total_bytes += size
+        evicted = self._evict()
+        if evicted:
+            await self._run_io(self._remove_files, evicted)
+        return path if key in self._entries else None
+
+    @staticmethod
+    def _commit(tmp_path: str, path: str) -> int:
+        """将临时文件原子地移入缓存，返回文件大小（阻塞操作）"""
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    @staticmethod
+    def _remove_files(paths, warn: bool = True):
+        """删除文件（阻塞操作）"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                if warn:
+                    logger.warning(f"淘汰音频缓存 {os.path.basename(path)} 失败: {e}")
+
+    def _evict(self) -> list:
+        """按LRU顺序淘汰条目，直到满足大小和数量限制；返回需要删除的文件路径，由调用方在线程中删除"""
+        evicted = []
+        while self._entries and (
+            (self.max_bytes > 0 and self._total_bytes > self.max_bytes)
+            or (self.max_entries > 0 and len(self._entries) > self.max_entries)
+        ):
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(self._path_for(key))
+        return evicted
+
+    def stats(self) -> Dict:
+        """返回缓存的命中统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+from astrbot.api import logger
+
+from .audio_io import AudioIOExecutor
+
+# 输出格式: (文件后缀, ffmpeg 编码参数)
+OUTPUT_FORMATS = {
+    "opus": (".ogg", ["-c:a", "libopus", "-application", "voip"]),
+    "mp3": (".mp3", ["-c:a", "libmp3lame"]),
+}
+
+
+class AudioEncoder:
+    """
+    将合成好的WAV编码为体积更小的格式（OGG/Opus 或 MP3），缩短上传到聊天平台的时间。
+    编码由独立的 ffmpeg 进程完成，不占用事件循环；同时运行的编码进程数有上限。
+    """
+
+    def __init__(
+        self, output_format: str, bitrate_kbps: int = 32, max_workers: int = 2,
+        io_executor: Optional[AudioIOExecutor] = None,
+    ):
+        """
+        :param output_format: OUTPUT_FORMATS 中的格式名。
+        :param bitrate_kbps: 目标码率。
+        :param max_workers: 同时运行的编码进程数上限。
+        :param io_executor: 可选，执行文件操作的线程池；为 None 时使用默认线程池。
+        """
+        self._run_io = io_executor.run if io_executor else asyncio.to_thread
+        self.output_format = output_format
+        self.suffix, self._codec_args = OUTPUT_FORMATS[output_format]
+        self.bitrate_kbps = bitrate_kbps
+        self.ffmpeg_path = shutil.which("ffmpeg")
+        self._slots = asyncio.Semaphore(max(1, max_workers))
+        self.encoded = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        if not self.ffmpeg_path:
+            logger.warning(f"未找到 ffmpeg，无法编码为 {output_format}，将直接发送WAV。")
+
+    @property
+    def available(self) -> bool:
+        return bool(self.ffmpeg_path)
+
+    async def encode(self, wav_path: str, output_path: str, timeout: float = 60.0) -> bool:
+        """将 wav_path 编码到 output_path，成功返回 True；失败时不会留下输出文件"""
+        async with self._slots:
+            start_time = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.ffmpeg_path, "-nostdin", "-y", "-loglevel", "error", "-i", wav_path,
+                    *self._codec_args, "-b:a", f"{self.bitrate_kbps}k", output_path,
+                    stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                logger.warning(f"启动 ffmpeg 失败: {e}")
+                self.failures += 1
+                return False
+
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                # 超时或被取消时结束编码进程；进程可能恰好已经退出
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+                await self._discard(output_path)
+                self.failures += 1
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                logger.warning(f"音频编码超过 {timeout:.0f} 秒未完成，已放弃。")
+                return False
+            finally:
+                self.seconds += time.monotonic() - start_time
+
+        if process.returncode != 0:
+            logger.warning(f"音频编码失败 ({process.returncode}): {stderr.decode(errors='ignore').strip()}")
+            await self._discard(output_path)
+            self.failures += 1
+            return False
+
+        self.encoded += 1
+        try:
+            bytes_in, bytes_out = await self._run_io(self._file_sizes, wav_path, output_path)
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+        except OSError:
+            pass
+        return True
+
+    @staticmethod
+    def _file_sizes(*paths: str) -> tuple:
+        return tuple(os.path.getsize(path) for path in paths)
+
+    async def _discard(self, path: str):
+        try:
+            await self._run_io(os.remove, path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        return {
+            "format": self.output_format,
+            "available": self.available,
+            "encoded": self.encoded,
+            "failures": self.failures,
+            "seconds": self.seconds,
+            "compression_ratio": self.bytes_out / self.bytes_in if self.bytes_in else None,
+        }
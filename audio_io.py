@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+from astrbot.api import logger
+
+T = TypeVar("T")
+
+
+class AudioIOExecutor:
+    """
+    音频文件读写专用的线程池。所有阻塞的磁盘操作都通过它执行，避免占用AstrBot共享的事件循环，
+    也不会与其他插件争用默认线程池。同时统计排队和执行耗时。
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts-audio-io")
+        self.tasks = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_busy_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _timed(self, submitted_at: float, func: Callable[..., T], *args) -> T:
+        started_at = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.monotonic() - started_at
+            with self._stats_lock:
+                self.wait_seconds += started_at - submitted_at
+                self.busy_seconds += elapsed
+                self.max_busy_seconds = max(self.max_busy_seconds, elapsed)
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """在线程池中执行阻塞函数并等待结果"""
+        loop = asyncio.get_running_loop()
+        self.tasks += 1
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(self._timed, time.monotonic(), func, *args)
+            )
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def submit(self, func: Callable[..., object], *args):
+        """
+        在线程池中执行阻塞函数但不等待结果，用于无法等待的同步代码中的清理操作（如删除临时文件）。
+        失败时只记录日志；线程池已关闭时直接在当前线程执行。
+        """
+        self.tasks += 1
+        try:
+            future = self._executor.submit(self._timed, time.monotonic(), func, *args)
+        except RuntimeError:
+            func(*args)
+            return
+        future.add_done_callback(self._log_failure)
+
+    def _log_failure(self, future: Future):
+        error = future.exception()
+        if error is not None:
+            with self._stats_lock:
+                self.failures += 1
+            logger.warning(f"后台音频文件操作失败: {error}")
+
+    def shutdown(self):
+        """停止接受新任务，已提交的任务会继续执行完毕"""
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "tasks": self.tasks,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "busy_seconds": self.busy_seconds,
+            "wait_seconds": self.wait_seconds,
+            "max_busy_seconds": self.max_busy_seconds,
+            "avg_busy_seconds": self.busy_seconds / self.tasks if self.tasks else 0.0,
+        }
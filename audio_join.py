@@ -0,0 +1,125 @@
+import wave
+from typing import List, Optional
+
+from astrbot.api import logger
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时退回直接拼接
+    np = None
+
+# 用于检测静音的分析窗口长度
+ANALYSIS_FRAME_MS = 10
+
+
+class ChunkJoiner:
+    """
+    无缝拼接分块音频：在每个分块边界处按RMS阈值裁掉首尾静音，插入固定长度的停顿，并做短淡入淡出
+    （停顿为 0 时直接交叉淡化）。只读取并处理边界附近的数据，分块中间部分原样写入，
+    因此耗时与音频总长度基本无关。需要 numpy，所有计算均为向量化操作。
+    """
+
+    def __init__(
+        self, sample_rate: int, channels: int, sample_width: int, silence_threshold_db: float = -40.0,
+        pause_ms: int = 120, crossfade_ms: int = 10, max_trim_ms: int = 500,
+    ):
+        """
+        :param silence_threshold_db: 相对满幅的静音阈值 (dBFS)，RMS 低于该值的窗口视为静音。
+        :param pause_ms: 分块之间插入的停顿长度。
+        :param crossfade_ms: 边界处淡入淡出（或交叉淡化）的长度。
+        :param max_trim_ms: 每个边界最多裁掉的静音长度，同时也是读取的边界数据长度。
+        """
+        if sample_width != 2:
+            raise ValueError("仅支持16位PCM")
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_bytes = sample_width * channels
+        self.window_frames = max(1, sample_rate * ANALYSIS_FRAME_MS // 1000)
+        self.threshold = 32768.0 * 10 ** (silence_threshold_db / 20.0)
+        self.pause_frames = max(0, sample_rate * pause_ms // 1000)
+        self.crossfade_frames = max(0, sample_rate * crossfade_ms // 1000)
+        self.max_trim_frames = max(0, sample_rate * max_trim_ms // 1000)
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def _to_frames(self, data) -> "np.ndarray":
+        return np.frombuffer(data, dtype="<i2").reshape(-1, self.channels).astype(np.float32)
+
+    def _voiced_windows(self, frames: "np.ndarray") -> "np.ndarray":
+        """返回每个分析窗口是否高于静音阈值"""
+        count = len(frames) // self.window_frames
+        if count == 0:
+            return np.zeros(0, dtype=bool)
+        windows = frames[:count * self.window_frames].reshape(count, -1)
+        rms = np.sqrt(np.mean(np.square(windows), axis=1))
+        return rms > self.threshold
+
+    def _leading_silence(self, chunk, total: int) -> int:
+        """分块开头的静音帧数（保留一个窗口的余量）"""
+        head = self._to_frames(chunk.read_frames(0, min(total, self.max_trim_frames)))
+        voiced = self._voiced_windows(head)
+        if not voiced.any():
+            return len(voiced) * self.window_frames
+        return max(0, int(voiced.argmax()) - 1) * self.window_frames
+
+    def _trailing_silence(self, chunk, total: int) -> int:
+        """分块末尾的静音帧数（保留一个窗口的余量）"""
+        tail = self._to_frames(chunk.read_frames(max(0, total - self.max_trim_frames), total))[::-1]
+        voiced = self._voiced_windows(tail)
+        if not voiced.any():
+            return len(voiced) * self.window_frames
+        return max(0, int(voiced.argmax()) - 1) * self.window_frames
+
+    def _ramp(self, length: int, rising: bool) -> "np.ndarray":
+        ramp = np.linspace(0.0, 1.0, length + 2, dtype=np.float32)[1:-1]
+        return (ramp if rising else ramp[::-1])[:, None]
+
+    def _to_bytes(self, frames: "np.ndarray") -> bytes:
+        return np.clip(np.rint(frames), -32768, 32767).astype("<i2").tobytes()
+
+    def write(self, wf: wave.Wave_write, chunks: List) -> None:
+        """将分块拼接后写入已打开的WAV文件（阻塞操作，应在线程中调用）"""
+        last = len(chunks) - 1
+        pending: Optional["np.ndarray"] = None  # 上一块已淡出的结尾，等待与下一块开头衔接
+        trimmed = 0
+        for i, chunk in enumerate(chunks):
+            total = chunk.frame_count()
+            start = self._leading_silence(chunk, total) if i > 0 else 0
+            end = total - self._trailing_silence(chunk, total) if i < last else total
+            if end <= start:
+                trimmed += total
+                continue
+            trimmed += total - (end - start)
+
+            fade = min(self.crossfade_frames, (end - start) // 2)
+            head_fade = fade if pending is not None else 0
+            tail_fade = fade if i < last else 0
+
+            if pending is not None:
+                head = self._to_frames(chunk.read_frames(start, start + head_fade)) * self._ramp(head_fade, True)
+                if self.pause_frames == 0:
+                    overlap = min(len(pending), len(head))
+                    mixed = np.concatenate([
+                        pending[:len(pending) - overlap],
+                        pending[len(pending) - overlap:] + head[:overlap],
+                        head[overlap:],
+                    ])
+                    wf.writeframes(self._to_bytes(mixed))
+                else:
+                    wf.writeframes(self._to_bytes(pending))
+                    wf.writeframes(bytes(self.pause_frames * self.frame_bytes))
+                    wf.writeframes(self._to_bytes(head))
+                pending = None
+
+            chunk.write_frames(wf, start + head_fade, end - tail_fade)
+            if tail_fade:
+                tail = self._to_frames(chunk.read_frames(end - tail_fade, end))
+                pending = tail * self._ramp(tail_fade, False)
+            elif i < last:
+                pending = np.zeros((0, self.channels), dtype=np.float32)
+
+        if pending is not None and len(pending):
+            wf.writeframes(self._to_bytes(pending))
+        logger.debug(f"拼接 {len(chunks)} 个分块，裁掉静音 {trimmed} 帧。")
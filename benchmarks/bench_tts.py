@@ -0,0 +1,449 @@
+"""
+离线基准测试：启动本地的桩 Genie TTS 服务器和翻译API服务器，以接近真实的回复长度分布和并发会话驱动
+translate_text / stream_translate_text 和 TTSEngine，统计首段语音时间、总耗时和服务器利用率。
+无需 GPU 和 API Key，用于比较代码修改前后的吞吐和延迟。
+
+需要在装有 AstrBot 的环境中运行（插件依赖 astrbot.api），桩服务器使用 aiohttp：
+
+    python benchmarks/bench_tts.py --servers 2 --sessions 8 --replies 10
+    python benchmarks/bench_tts.py --translation stream --progressive --json result.json
+    python benchmarks/bench_tts.py --set enable_sentence_splitting=true --set chunk_strategy=balanced
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+from aiohttp import web
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_DIR.parent))
+tts_engine = importlib.import_module(f"{PLUGIN_DIR.name}.tts_engine")
+external_apis = importlib.import_module(f"{PLUGIN_DIR.name}.external_apis")
+deadline_module = importlib.import_module(f"{PLUGIN_DIR.name}.deadline")
+
+# 用于拼接测试文本的日语句子
+SAMPLE_SENTENCES = [
+    "今日はとても良い天気ですね。",
+    "少し考えてみます。",
+    "それは本当に面白い話だと思います！",
+    "先生、次の授業はいつから始まりますか？",
+    "ありがとう、助かりました。",
+    "この問題はもう一度確認したほうがいいかもしれません。",
+    "はい、わかりました。",
+    "夜になると街の明かりがとてもきれいに見えます。",
+]
+
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(p / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class StubGenieServer:
+    """
+    模拟 Genie TTS 服务器。每台服务器有固定的推理槽位（模拟GPU），请求在槽位上排队；
+    /tts 按实时率分块流式返回PCM，可配置首包延迟、合成速度和失败率。
+    """
+
+    def __init__(self, args: argparse.Namespace, rng: random.Random):
+        self.args = args
+        self.rng = rng
+        self.slots = asyncio.Semaphore(args.server_slots)
+        self.busy_seconds = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.url = ""
+
+    async def set_reference(self, request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(self.args.reference_latency)
+        return web.json_response({"status": "ok"})
+
+    async def tts(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self.requests += 1
+        async with self.slots:
+            start_time = time.monotonic()
+            try:
+                await asyncio.sleep(self.args.first_byte_latency * self.rng.uniform(0.8, 1.2))
+                if self.rng.random() < self.args.failure_rate:
+                    self.failures += 1
+                    return web.Response(status=500, text="stub failure")
+
+                response = web.StreamResponse()
+                response.content_type = "application/octet-stream"
+                await response.prepare(request)
+                audio_seconds = len(payload["text"]) * self.args.seconds_per_char
+                block_seconds = 0.5
+                frames_per_block = int(tts_engine.SAMPLE_RATE * block_seconds)
+                block = bytes(frames_per_block * tts_engine.BYTES_PER_SAMPLE * tts_engine.CHANNELS)
+                remaining = audio_seconds
+                while remaining > 0:
+                    part = min(block_seconds, remaining)
+                    await asyncio.sleep(part * self.args.realtime_factor)
+                    await response.write(block[:int(len(block) * part / block_seconds) & ~1])
+                    remaining -= part
+                await response.write_eof()
+                return response
+            finally:
+                self.busy_seconds += time.monotonic() - start_time
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/set_reference_audio", self.set_reference)
+        app.router.add_post("/tts", self.tts)
+        return app
+
+
+class StubTranslationServer:
+    """模拟 OpenAI / Gemini 聊天接口，原样返回输入文本；支持非流式和 SSE 流式响应"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.requests = 0
+
+    def _latency(self, text: str) -> float:
+        return self.args.translation_latency + len(text) / self.args.translation_chars_per_second
+
+    @staticmethod
+    def _user_text(payload: Dict) -> str:
+        if "messages" in payload:
+            return payload["messages"][-1]["content"]
+        return payload["contents"][0]["parts"][0]["text"]
+
+    @staticmethod
+    def _openai_event(text: str) -> Dict:
+        return {"choices": [{"delta": {"content": text}}]}
+
+    @staticmethod
+    def _gemini_event(text: str) -> Dict:
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    async def _stream(self, request: web.Request, text: str, make_event) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.args.translation_latency)
+        step = 8
+        for i in range(0, len(text), step):
+            piece = text[i:i + step]
+            await asyncio.sleep(len(piece) / self.args.translation_chars_per_second)
+            data = json.dumps(make_event(piece), ensure_ascii=False)
+            await response.write(f"data: {data}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def openai(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self.requests += 1
+        text = self._user_text(payload)
+        if payload.get("stream"):
+            return await self._stream(request, text, self._openai_event)
+        await asyncio.sleep(self._latency(text))
+        return web.json_response({"choices": [{"message": {"content": text}}]})
+
+    async def gemini(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self.requests += 1
+        text = self._user_text(payload)
+        if request.match_info["method"] == "streamGenerateContent":
+            return await self._stream(request, text, self._gemini_event)
+        await asyncio.sleep(self._latency(text))
+        return web.json_response(self._gemini_event(text))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.openai)
+        app.router.add_post("/v1beta/models/{model}:{method}", self.gemini)
+        return app
+
+
+async def start_app(app: web.Application, runners: List[web.AppRunner]) -> str:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    runners.append(runner)
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+
+def load_default_config() -> Dict:
+    """从 _conf_schema.json 读取插件配置的默认值"""
+    def defaults(schema: Dict) -> Dict:
+        config = {}
+        for key, item in schema.items():
+            if item.get("type") == "object":
+                config[key] = defaults(item.get("items", {}))
+            elif "default" in item:
+                config[key] = item["default"]
+        return config
+
+    with open(PLUGIN_DIR / "_conf_schema.json", encoding="utf-8") as f:
+        return defaults(json.load(f))
+
+
+def parse_overrides(entries: List[str]) -> Dict:
+    overrides = {}
+    for entry in entries:
+        key, sep, value = entry.partition("=")
+        if not sep:
+            raise SystemExit(f"无效的 --set 参数: {entry}，格式应为 key=value")
+        try:
+            overrides[key.strip()] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key.strip()] = value
+    return overrides
+
+
+def make_reply_text(rng: random.Random, args: argparse.Namespace) -> str:
+    """按对数正态分布生成回复长度，再用样本句子拼出该长度的文本"""
+    target = int(rng.lognormvariate(math.log(args.median_chars), args.sigma))
+    target = max(args.min_chars, min(args.max_chars, target))
+    parts, length = [], 0
+    while length < target:
+        sentence = rng.choice(SAMPLE_SENTENCES)
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)
+
+
+async def run_reply(
+    engine, http_client: httpx.AsyncClient, args: argparse.Namespace, api_config: Dict, text: str, session_id: str,
+    batcher=None,
+) -> Dict:
+    """按插件的回复流程处理一条回复：翻译后合成（或流式翻译与合成重叠），记录各项耗时"""
+    deadline = deadline_module.Deadline(args.deadline)
+    synth_kwargs = dict(
+        character_name="bench", ref_audio_path="reference_audio/bench.wav", ref_audio_text="テスト",
+        session_id_for_log=session_id, deadline=deadline,
+    )
+    start_time = time.monotonic()
+    result = {"chars": len(text), "ok": False, "first_audio": None, "total": None, "translate": None}
+
+    if args.translation == "stream":
+        text_stream = external_apis.stream_translate_text(
+            text, http_client, api_config, deadline=deadline, metrics=engine.metrics
+        )
+        segments = engine.synthesize_stream_segments(
+            text_stream=text_stream, first_segment_chunks=None if args.progressive else 0, **synth_kwargs
+        )
+    else:
+        translated = await external_apis.translate_text(
+            text, http_client, api_config, deadline=deadline, metrics=engine.metrics, batcher=batcher
+        )
+        result["translate"] = time.monotonic() - start_time
+        if not translated:
+            result["total"] = time.monotonic() - start_time
+            return result
+        segments = engine.synthesize_segments(
+            text=translated, first_segment_chunks=None if args.progressive else 0, **synth_kwargs
+        )
+
+    try:
+        async for audio_path, is_last in segments:
+            if audio_path and result["first_audio"] is None:
+                result["first_audio"] = time.monotonic() - start_time
+            if is_last:
+                result["ok"] = bool(audio_path)
+    finally:
+        await segments.aclose()
+    result["total"] = time.monotonic() - start_time
+    result["partial"] = deadline.expired()
+    return result
+
+
+async def run_session(
+    engine, http_client: httpx.AsyncClient, args: argparse.Namespace, api_config: Dict, session_index: int,
+    results: List[Dict], batcher=None,
+):
+    rng = random.Random(args.seed * 1000 + session_index)
+    # 会话错开开始，避免所有请求在同一时刻到达
+    await asyncio.sleep(rng.uniform(0, args.think_time))
+    for reply_index in range(args.replies):
+        text = make_reply_text(rng, args)
+        results.append(await run_reply(
+            engine, http_client, args, api_config, text, f"bench-{session_index}-{reply_index}", batcher
+        ))
+        await asyncio.sleep(rng.expovariate(1.0 / args.think_time) if args.think_time > 0 else 0)
+
+
+def summarize(
+    results: List[Dict], servers: List[StubGenieServer], translator: StubTranslationServer, elapsed: float,
+    args: argparse.Namespace,
+) -> Dict:
+    def dist(key: str) -> Dict:
+        samples = [r[key] for r in results if r.get(key) is not None]
+        return {f"p{p}": percentile(samples, p) for p in (50, 95, 99)}
+
+    return {
+        "replies": len(results),
+        "succeeded": sum(1 for r in results if r["ok"]),
+        "partial": sum(1 for r in results if r.get("partial")),
+        "elapsed": elapsed,
+        "replies_per_second": len(results) / elapsed if elapsed else None,
+        "chars": sum(r["chars"] for r in results),
+        "time_to_first_audio": dist("first_audio"),
+        "total_latency": dist("total"),
+        "translate_latency": dist("translate"),
+        "translation_requests": translator.requests,
+        "servers": [
+            {
+                "url": server.url,
+                "requests": server.requests,
+                "failures": server.failures,
+                "utilization": server.busy_seconds / (elapsed * args.server_slots) if elapsed else None,
+            }
+            for server in servers
+        ],
+    }
+
+
+def print_report(summary: Dict):
+    def fmt(value: Optional[float]) -> str:
+        return f"{'-':>8}" if value is None else f"{value:7.3f}s"
+
+    print(f"\n回复数 {summary['replies']}，成功 {summary['succeeded']}，因截止时间只完成部分 {summary['partial']}，"
+          f"总耗时 {summary['elapsed']:.1f}s，吞吐 {summary['replies_per_second']:.2f} 条/秒")
+    print(f"{'':14}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for label, key in (("首段语音", "time_to_first_audio"), ("总耗时", "total_latency"), ("翻译", "translate_latency")):
+        dist = summary[key]
+        print(f"{label:12}{fmt(dist['p50'])} {fmt(dist['p95'])} {fmt(dist['p99'])}")
+    print(f"\n翻译API请求 {summary['translation_requests']} 次")
+    print("服务器利用率:")
+    for server in summary["servers"]:
+        utilization = server["utilization"]
+        print(f"  {server['url']}: 请求 {server['requests']}，失败 {server['failures']}，"
+              f"利用率 {'-' if utilization is None else f'{utilization:.0%}'}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="TTS 插件离线基准测试")
+    workload = parser.add_argument_group("负载")
+    workload.add_argument("--sessions", type=int, default=8, help="并发会话数")
+    workload.add_argument("--replies", type=int, default=10, help="每个会话的回复数")
+    workload.add_argument("--think-time", type=float, default=1.0, help="同一会话两条回复之间的平均间隔（秒）")
+    workload.add_argument("--median-chars", type=int, default=60, help="回复长度中位数（字）")
+    workload.add_argument("--sigma", type=float, default=0.8, help="回复长度对数正态分布的 sigma")
+    workload.add_argument("--min-chars", type=int, default=5)
+    workload.add_argument("--max-chars", type=int, default=400)
+    workload.add_argument("--translation", choices=["full", "stream"], default="full", help="翻译方式")
+    workload.add_argument("--api-format", choices=["openai", "gemini"], default="openai")
+    workload.add_argument("--progressive", action="store_true", help="渐进式发送，首段就绪即视为首段语音")
+    workload.add_argument("--deadline", type=float, default=0, help="单次回复截止时间（秒），0 表示不限制")
+    workload.add_argument("--seed", type=int, default=1)
+
+    stub = parser.add_argument_group("桩服务器")
+    stub.add_argument("--servers", type=int, default=2, help="TTS服务器数量")
+    stub.add_argument("--server-slots", type=int, default=1, help="每台服务器同时推理的请求数")
+    stub.add_argument("--first-byte-latency", type=float, default=0.3, help="TTS首包延迟（秒）")
+    stub.add_argument("--seconds-per-char", type=float, default=0.15, help="每个字对应的音频时长（秒）")
+    stub.add_argument("--realtime-factor", type=float, default=0.3, help="合成耗时与音频时长之比")
+    stub.add_argument("--failure-rate", type=float, default=0.0, help="TTS请求失败的概率")
+    stub.add_argument("--reference-latency", type=float, default=0.2, help="设置参考音频的耗时（秒）")
+    stub.add_argument("--translation-latency", type=float, default=0.5, help="翻译首包延迟（秒）")
+    stub.add_argument("--translation-chars-per-second", type=float, default=100.0, help="翻译输出速度（字/秒）")
+
+    engine = parser.add_argument_group("插件")
+    engine.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="覆盖插件配置项，VALUE 按 JSON 解析，可重复")
+    engine.add_argument("--cache", action="store_true", help="启用音频缓存（默认关闭，避免重复文本命中缓存）")
+    engine.add_argument("--json", metavar="PATH", help="将结果写入 JSON 文件，便于跟踪性能回归")
+    engine.add_argument("--verbose", action="store_true", help="输出插件日志")
+    return parser
+
+
+async def main(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    runners: List[web.AppRunner] = []
+    servers = [StubGenieServer(args, rng) for _ in range(args.servers)]
+    for server in servers:
+        server.url = await start_app(server.app(), runners)
+    translator = StubTranslationServer(args)
+    translator_url = await start_app(translator.app(), runners)
+
+    config = load_default_config()
+    config.update({
+        "tts_servers": [server.url for server in servers],
+        "enable_warmup": False,
+        "enable_translation_cache": False,
+    })
+    config.update(parse_overrides(args.set))
+    api_config = dict(config.get("translation_api", {}))
+    api_config.update({
+        "base_url": f"{translator_url}/v1" if args.api_format == "openai" else translator_url,
+        "api_key": "bench",
+        "api_format": args.api_format,
+    })
+
+    work_dir = tempfile.mkdtemp(prefix="tts_bench_")
+    previous_dir = os.getcwd()
+    # 引擎的临时文件写在当前目录的 data/ 下
+    os.chdir(work_dir)
+    audio_cache = None
+    if args.cache:
+        audio_cache_module = importlib.import_module(f"{PLUGIN_DIR.name}.audio_cache")
+        audio_cache = audio_cache_module.AudioCache(
+            Path(work_dir) / "audio_cache",
+            max_bytes=int(config.get("audio_cache_max_mb", 256)) * 1024 * 1024,
+            max_entries=int(config.get("audio_cache_max_entries", 2000)),
+        )
+
+    results: List[Dict] = []
+    try:
+        async with httpx.AsyncClient(timeout=300.0) as http_client:
+            engine = tts_engine.TTSEngine(config, http_client, audio_cache)
+            batcher = None
+            if config.get("enable_translation_batching", False):
+                batcher = external_apis.TranslationBatcher(
+                    window=float(config.get("translation_batch_window_ms", 50)) / 1000.0,
+                    max_size=int(config.get("translation_batch_max_size", 8)),
+                )
+            start_time = time.monotonic()
+            try:
+                await asyncio.gather(*(
+                    run_session(engine, http_client, args, api_config, i, results, batcher)
+                    for i in range(args.sessions)
+                ))
+                elapsed = time.monotonic() - start_time
+                summary = summarize(results, servers, translator, elapsed, args)
+                summary["engine"] = engine.stats()
+                if batcher:
+                    summary["translation_batcher"] = batcher.stats()
+            finally:
+                if batcher:
+                    await batcher.close()
+                await engine.close()
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        for runner in runners:
+            await runner.cleanup()
+
+    print_report(summary)
+    if args.json:
+        summary["args"] = vars(args)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    parsed = build_parser().parse_args()
+    for name in ("astrbot", "httpx"):
+        logging.getLogger(name).setLevel(logging.INFO if parsed.verbose else logging.WARNING)
+    asyncio.run(main(parsed))
@@ -0,0 +1,42 @@
+import asyncio
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 截止时间将至时，单次请求至少保留的超时时间
+MIN_CALL_TIMEOUT = 1.0
+
+
+class Deadline:
+    """
+    一次回复的端到端截止时间。翻译、设置参考音频、合成和故障转移共用同一个预算，
+    每次外部调用的超时取其固定上限与剩余时间中的较小值。
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        """:param seconds: 从现在起的可用时间，None 或 <=0 表示不限制。"""
+        self.expires_at = time.monotonic() + seconds if seconds and seconds > 0 else None
+
+    def remaining(self) -> Optional[float]:
+        """剩余时间（秒）；不限制时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: float) -> float:
+        """单次调用的超时：不超过 cap，也不超过剩余时间"""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return max(MIN_CALL_TIMEOUT, min(cap, remaining))
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """在剩余时间内等待 awaitable，超时时取消它并抛出 asyncio.TimeoutError"""
+        remaining = self.remaining()
+        if remaining is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, remaining)
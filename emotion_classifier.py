@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from astrbot.api import logger
+
+# 结果来源，用于统计
+SOURCE_LOCAL = "local"        # 本地判断置信度足够，使用普通翻译提示词
+SOURCE_LLM = "llm"            # 由LLM给出情感标签
+SOURCE_FALLBACK = "fallback"  # LLM的标签缺失或无效，改用本地判断
+SOURCE_DEFAULT = "default"    # LLM和本地判断均无结果，使用默认情感
+SOURCE_FAILED = "failed"
+
+
+class EmotionClassifier:
+    """
+    基于关键词的本地情感判断，不依赖外部模型。
+    关键词配置文件与 emotions.json 放在一起，格式为 {"情感名": ["关键词", ...]}，对所有角色通用；
+    只在角色已注册的情感中选择。文件修改后自动重新加载。
+    """
+
+    RELOAD_INTERVAL_SECONDS = 5.0
+
+    def __init__(self, file_path, min_hits: int = 2, min_confidence: float = 0.6):
+        """
+        :param file_path: 关键词配置文件路径，不存在时本地判断不生效。
+        :param min_hits: 最佳情感至少命中的关键词次数。
+        :param min_confidence: 最佳情感的命中次数占全部命中次数的最低比例。
+        """
+        self.file_path = str(file_path)
+        self.min_hits = max(1, min_hits)
+        self.min_confidence = min_confidence
+        self._pattern: Optional[re.Pattern] = None
+        self._keyword_emotions: Dict[str, List[str]] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.counters: Counter = Counter()
+        self._load()
+
+    def _load(self):
+        """加载关键词并编译为一个正则表达式（阻塞操作）"""
+        try:
+            self._mtime = os.path.getmtime(self.file_path)
+        except OSError:
+            self._mtime = None
+            self._pattern = None
+            self._keyword_emotions = {}
+            return
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            keyword_emotions: Dict[str, List[str]] = {}
+            for emotion_name, keywords in data.items():
+                # 单个关键词可以直接写成字符串，否则会被逐字拆开
+                if isinstance(keywords, str):
+                    keywords = [keywords]
+                elif not isinstance(keywords, list):
+                    logger.warning(f"情感 [{emotion_name}] 的关键词应为列表，已忽略。")
+                    continue
+                for keyword in keywords:
+                    keyword = str(keyword).strip().lower()
+                    if keyword:
+                        keyword_emotions.setdefault(keyword, []).append(emotion_name)
+        except (json.JSONDecodeError, OSError, AttributeError, TypeError) as e:
+            logger.error(f"加载情感关键词失败: {e}")
+            return
+        self._keyword_emotions = keyword_emotions
+        # 长关键词优先匹配，避免被其中包含的短关键词抢先
+        alternatives = sorted(keyword_emotions, key=len, reverse=True)
+        self._pattern = re.compile("|".join(map(re.escape, alternatives))) if alternatives else None
+        logger.info(f"已加载 {len(data)} 个情感的 {len(keyword_emotions)} 个关键词。")
+
+    async def maybe_reload(self):
+        """距离上次检查超过一定时间时，检查文件是否被修改"""
+        now = time.monotonic()
+        if now - self._checked_at < self.RELOAD_INTERVAL_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            mtime = await asyncio.to_thread(os.path.getmtime, self.file_path)
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            await asyncio.to_thread(self._load)
+
+    @property
+    def available(self) -> bool:
+        return self._pattern is not None
+
+    def score(self, text: str, candidates: Iterable[str]) -> Dict[str, int]:
+        """统计每个候选情感的关键词命中次数"""
+        if not self._pattern:
+            return {}
+        allowed = set(candidates)
+        scores: Counter = Counter()
+        for keyword in self._pattern.findall(text.lower()):
+            for emotion_name in self._keyword_emotions[keyword]:
+                if emotion_name in allowed:
+                    scores[emotion_name] += 1
+        return dict(scores)
+
+    def classify(self, text: str, candidates: Iterable[str]) -> Tuple[Optional[str], bool]:
+        """返回 (命中最多的情感, 置信度是否足以跳过LLM的情感识别)；没有命中时返回 (None, False)"""
+        scores = self.score(text, candidates)
+        if not scores:
+            return None, False
+        emotion_name, hits = max(scores.items(), key=lambda item: item[1])
+        confident = hits >= self.min_hits and hits / sum(scores.values()) >= self.min_confidence
+        return emotion_name, confident
+
+    def record(self, source: str):
+        self.counters[source] += 1
+
+    def stats(self) -> Dict:
+        return {
+            "keywords": len(self._keyword_emotions),
+            **{source: self.counters[source]
+               for source in (SOURCE_LOCAL, SOURCE_LLM, SOURCE_FALLBACK, SOURCE_DEFAULT, SOURCE_FAILED)},
+        }
@@ -1,50 +1,173 @@
+import asyncio
 import json
 import os
+import tempfile
 from typing import Dict, Optional
 
 from astrbot.api import logger
 
 class EmotionManager:
-    """处理所有与感情数据相关的加载、保存和管理逻辑"""
+    """
+    处理所有与感情数据相关的加载、保存和管理逻辑。
+    修改立即作用于内存，短时间内的多次修改合并为一次保存；保存在线程中先写临时文件再替换，不会损坏原文件。
+    后台定期检查文件的修改时间，插件外部对文件的修改会被自动加载。
+    """
+
+    SAVE_DELAY_SECONDS = 0.5
+    RELOAD_INTERVAL_SECONDS = 5.0
 
     def __init__(self, file_path):
         """
         初始化感情管理器。
         :param file_path: emotions.json 文件的路径。
         """
-        self.file_path = file_path
-        self.emotions_data: Dict = self._load_emotions_from_file()
-
-    def _load_emotions_from_file(self) -> Dict:
-        """从JSON文件加载感情数据"""
+        self.file_path = str(file_path)
+        self.emotions_data: Dict = {}
+        self._emotion_lists: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+        self._save_task: Optional[asyncio.Task] = None
+        self._save_result: Optional[asyncio.Future] = None
+        # 保证同一时刻只有一次保存在写文件
+        self._save_lock = asyncio.Lock()
+        # 每次修改递增，用于判断后台重新加载期间是否发生了修改
+        self._generation = 0
+        self._watch_task: Optional[asyncio.Task] = None
         if not os.path.exists(self.file_path):
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                json.dump({}, f)
-            return {}
+            self._write_file({})
+        self._apply(self._load_emotions_from_file())
+
+    def _load_emotions_from_file(self) -> Optional[Dict]:
+        """从JSON文件加载感情数据，失败时返回 None"""
         try:
+            # 加载失败时同样记录修改时间，文件再次被修改前不再重复尝试
+            self._mtime = os.path.getmtime(self.file_path)
             with open(self.file_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                logger.info(
-                    f"成功从 {self.file_path} 加载 {sum(len(v) for v in data.values())} 个感情配置。"
-                )
-                return data
-        except (json.JSONDecodeError, IOError) as e:
+            if not isinstance(data, dict):
+                raise ValueError("顶层必须是对象")
+        except (json.JSONDecodeError, ValueError, OSError) as e:
             logger.error(f"加载感情文件失败: {e}")
-            return {}
+            return None
+        logger.info(f"成功从 {self.file_path} 加载 {sum(len(v) for v in data.values())} 个感情配置。")
+        return data
+
+    def _apply(self, data: Optional[Dict]):
+        """替换内存中的数据；加载失败时保留原有数据"""
+        if data is None:
+            return
+        self.emotions_data = data
+        self._emotion_lists = {character: ", ".join(emotions) for character, emotions in data.items()}
 
-    def _save_emotions_to_file(self) -> bool:
-        """将当前感情数据保存到JSON文件"""
+    def _refresh_emotion_list(self, character_name: str):
+        emotions = self.emotions_data.get(character_name)
+        if emotions:
+            self._emotion_lists[character_name] = ", ".join(emotions)
+        else:
+            self._emotion_lists.pop(character_name, None)
+
+    def _write_file(self, snapshot: Dict) -> float:
+        """原子地写入文件（阻塞操作），返回写入后的修改时间"""
+        directory, name = os.path.split(os.path.abspath(self.file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{name}.", suffix=".tmp")
         try:
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                json.dump(self.emotions_data, f, ensure_ascii=False, indent=4)
-            return True
-        except IOError as e:
-            logger.error(f"保存感情文件失败: {e}")
-            return False
-
-    def reload(self):
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return os.path.getmtime(self.file_path)
+
+    async def _save_emotions_to_file(self) -> bool:
+        """将当前感情数据保存到JSON文件；前一次保存仍在写入时等待其完成"""
+        async with self._save_lock:
+            # 在锁内取快照，后完成的保存总是写入较新的数据
+            # 感情条目在修改时整体替换，复制两层即可得到一致的快照
+            snapshot = {character: dict(emotions) for character, emotions in self.emotions_data.items()}
+            try:
+                self._mtime = await asyncio.to_thread(self._write_file, snapshot)
+                return True
+            except OSError as e:
+                logger.error(f"保存感情文件失败: {e}")
+                return False
+
+    async def _delayed_save(self, result: asyncio.Future):
+        await asyncio.sleep(self.SAVE_DELAY_SECONDS)
+        # 从此刻起的新修改由下一次保存负责
+        self._save_task = None
+        self._save_result = None
+        saved = await self._save_emotions_to_file()
+        if not result.done():
+            result.set_result(saved)
+
+    def _schedule_save(self) -> asyncio.Future:
+        """合并短时间内的多次修改，延迟保存；返回保存结果"""
+        if self._save_task is None:
+            self._save_result = asyncio.get_running_loop().create_future()
+            self._save_task = asyncio.create_task(self._delayed_save(self._save_result))
+        return self._save_result
+
+    async def flush(self):
+        """立即保存尚未写入的修改；没有待保存的修改时等待正在进行的保存完成"""
+        task, result = self._save_task, self._save_result
+        if task is None:
+            async with self._save_lock:
+                return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        self._save_task = None
+        self._save_result = None
+        saved = await self._save_emotions_to_file()
+        if not result.done():
+            result.set_result(saved)
+
+    async def reload(self):
         """从文件重新加载数据，用于在保存失败时恢复状态"""
-        self.emotions_data = self._load_emotions_from_file()
+        self._apply(await asyncio.to_thread(self._load_emotions_from_file))
+
+    async def _check_for_changes(self):
+        """文件被外部修改时重新加载；有尚未保存的修改时跳过，避免覆盖"""
+        if self._save_task is not None or self._save_lock.locked():
+            return
+        try:
+            mtime = await asyncio.to_thread(os.path.getmtime, self.file_path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            logger.info("检测到感情文件被修改，重新加载。")
+            generation = self._generation
+            data = await asyncio.to_thread(self._load_emotions_from_file)
+            # 加载期间有新的修改时放弃加载结果，该修改随后保存到文件中
+            if generation != self._generation or self._save_task is not None or self._save_lock.locked():
+                logger.info("重新加载期间感情数据被修改，放弃本次加载结果。")
+                return
+            self._apply(data)
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.RELOAD_INTERVAL_SECONDS)
+            try:
+                await self._check_for_changes()
+            except Exception as e:
+                logger.warning(f"检查感情文件时出错: {e}")
+
+    def start_watching(self):
+        """开始监视文件的外部修改（需要在事件循环中调用）"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch_loop())
+
+    async def close(self):
+        """停止监视并保存尚未写入的修改"""
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        await self.flush()
 
     def get_emotion_data(self, character_name: str, emotion_name: str) -> Optional[Dict]:
         """获取指定角色和感情的数据"""
@@ -54,7 +177,11 @@ class EmotionManager:
         """检查角色是否存在"""
         return character_name in self.emotions_data
 
-    def register_emotion(self, character_name: str, emotion_name: str, ref_audio_path: str, ref_audio_text: str) -> bool:
+    def emotion_list(self, character_name: str) -> str:
+        """角色的所有感情名（以逗号分隔），用于自动情感识别的提示词"""
+        return self._emotion_lists.get(character_name, "")
+
+    async def register_emotion(self, character_name: str, emotion_name: str, ref_audio_path: str, ref_audio_text: str) -> bool:
         """注册一个新的感情并保存"""
         if character_name not in self.emotions_data:
             self.emotions_data[character_name] = {}
@@ -63,9 +190,12 @@ class EmotionManager:
             "ref_audio_path": ref_audio_path,
             "ref_audio_text": ref_audio_text,
         }
-        return self._save_emotions_to_file()
+        self._refresh_emotion_list(character_name)
+        self._generation += 1
+        # 多个指令共用同一次保存，使用 shield 避免一个调用方被取消时连带取消保存结果
+        return await asyncio.shield(self._schedule_save())
 
-    def delete_emotion(self, character_name: str, emotion_name: str) -> bool:
+    async def delete_emotion(self, character_name: str, emotion_name: str) -> bool:
         """删除一个已注册的感情并保存"""
         if not self.get_emotion_data(character_name, emotion_name):
             return True # 如果不存在，也视为成功
@@ -73,5 +203,7 @@ class EmotionManager:
         del self.emotions_data[character_name][emotion_name]
         if not self.emotions_data[character_name]:
             del self.emotions_data[character_name]
+        self._refresh_emotion_list(character_name)
+        self._generation += 1
 
-        return self._save_emotions_to_file()
\ No newline at end of file
+        return await asyncio.shield(self._schedule_save())
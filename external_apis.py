@@ -1,10 +1,25 @@
-from typing import Optional
+import asyncio
+import json
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 
 import httpx
 from astrbot.api import logger
 
+from .deadline import Deadline
+from .metrics import Metrics
+from .translation_cache import TranslationCache
+
+
+class TranslationStreamError(Exception):
+    """流式翻译失败"""
+
+
 async def translate_text(
-    text: str, http_client: httpx.AsyncClient, api_config: dict, system_prompt_override: Optional[str] = None
+    text: str, http_client: httpx.AsyncClient, api_config: dict, system_prompt_override: Optional[str] = None,
+    cache: Optional[TranslationCache] = None, deadline: Optional[Deadline] = None,
+    metrics: Optional[Metrics] = None, batcher: Optional["TranslationBatcher"] = None,
 ) -> Optional[str]:
     """
     使用配置的API进行翻译。
@@ -12,7 +27,13 @@ async def translate_text(
     :param http_client: httpx 异步客户端实例。
     :param api_config: 插件配置中的 'translation_api' 部分。
     :param system_prompt_override: 可选，用于覆盖配置中的默认系统提示词。
+    :param cache: 可选，翻译缓存。提供时优先返回缓存结果，并合并并发的相同请求。
+    :param deadline: 可选，本次回复的截止时间；到达时放弃等待并返回 None。
+    :param metrics: 可选，记录每次实际请求翻译API的耗时（阶段 translate，不含缓存命中）。
+    :param batcher: 可选，将短时间内的多个翻译合并为一次请求。只用于配置中的通用提示词，
+                    覆盖提示词的请求（如自动情感识别）的输入本身包含指令，不参与合并。
     """
+    deadline = deadline or Deadline()
     base_url = api_config.get("base_url")
     api_key = api_config.get("api_key")
     model = api_config.get("model", "gpt-3.5-turbo")
@@ -25,33 +46,80 @@ async def translate_text(
         logger.error("翻译API配置不完整 (base_url, api_key)。")
         return None
 
+    if system_prompt_override:
+        batcher = None
+
+    async def fetch() -> Optional[str]:
+        start_time = time.monotonic()
+        if batcher:
+            result = await batcher.translate(
+                text, http_client, base_url, api_key, model, api_format, system_prompt, deadline.timeout(120.0)
+            )
+        else:
+            result = await _request_translation(
+                text, http_client, base_url, api_key, model, api_format, system_prompt, deadline.timeout(120.0)
+            )
+        if metrics:
+            metrics.observe("translate", time.monotonic() - start_time, error=result is None)
+        return result
+
+    try:
+        if cache is None:
+            return await deadline.run(fetch())
+        cache_key = TranslationCache.make_key(api_format, model, system_prompt, text)
+        # 每个调用方按自己的截止时间等待；发起请求的一方超时后，合并的调用方会重新发起请求
+        return await deadline.run(cache.get_or_fetch(cache_key, fetch))
+    except asyncio.TimeoutError:
+        logger.error("翻译请求超过回复截止时间，已放弃。")
+        return None
+
+
+def _build_request(
+    text: str, base_url: str, api_key: str, model: str, api_format: str, system_prompt: str, stream: bool = False,
+) -> Optional[Tuple[str, dict, dict]]:
+    """根据API格式构造请求的 (URL, 请求头, 请求体)，不支持的格式返回 None"""
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
     }
-    
-    try:
-        if api_format == "openai":
-            payload = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text},
-                ],
-            }
-            endpoint_url = f"{base_url.strip('/')}/chat/completions"
-        elif api_format == "gemini":
-            payload = {
-                "contents": [{"parts": [{"text": text}]}],
-                "systemInstruction": {"parts": [{"text": system_prompt}]}
-            }
-            endpoint_url = f"{base_url.strip('/')}/v1beta/models/{model}:generateContent?key={api_key}"
-            headers.pop("Authorization", None)
-        else:
-            logger.error(f"不支持的API格式: {api_format}")
-            return None
+    if api_format == "openai":
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text},
+            ],
+        }
+        if stream:
+            payload["stream"] = True
+        endpoint_url = f"{base_url.strip('/')}/chat/completions"
+    elif api_format == "gemini":
+        payload = {
+            "contents": [{"parts": [{"text": text}]}],
+            "systemInstruction": {"parts": [{"text": system_prompt}]}
+        }
+        method = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+        endpoint_url = f"{base_url.strip('/')}/v1beta/models/{model}:{method}key={api_key}"
+        headers.pop("Authorization", None)
+    else:
+        logger.error(f"不支持的API格式: {api_format}")
+        return None
+    return endpoint_url, headers, payload
+
+
+async def _request_translation(
+    text: str, http_client: httpx.AsyncClient, base_url: str, api_key: str,
+    model: str, api_format: str, system_prompt: str, timeout: float = 120.0,
+) -> Optional[str]:
+    """向翻译API发送一次请求并解析结果"""
+    request = _build_request(text, base_url, api_key, model, api_format, system_prompt)
+    if not request:
+        return None
+    endpoint_url, headers, payload = request
 
-        response = await http_client.post(endpoint_url, headers=headers, json=payload, timeout=120.0)
+    response = None
+    try:
+        response = await http_client.post(endpoint_url, headers=headers, json=payload, timeout=timeout)
         response.raise_for_status()
         data = response.json()
 
@@ -64,4 +132,242 @@ async def translate_text(
         logger.error(f"翻译请求失败: {e}\n响应: {getattr(response, 'text', 'N/A')}")
         return None
     
-    return None
\ No newline at end of file
+    return None
+
+
+# 附加在系统提示词之后，要求模型逐段处理并以JSON返回
+BATCH_INSTRUCTION = (
+    "\n\n本次输入是一个JSON对象，包含多段相互独立的文本，键为段落编号。"
+    "请按上述要求分别处理每一段，只输出一个JSON对象，键为相同的编号，值为对应段落的结果，不要输出任何其他内容。"
+)
+
+
+class _PendingBatch:
+    __slots__ = ("items", "timer")
+
+    def __init__(self):
+        self.items: List[Tuple[str, asyncio.Future, float]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+def _parse_batch_response(content: Optional[str], count: int) -> Optional[List[str]]:
+    """解析合并请求的结果，格式不符（缺少段落、类型错误等）时返回 None"""
+    if not content:
+        return None
+    # 模型经常用代码块包裹JSON
+    content = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", content)
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    results = []
+    for i in range(1, count + 1):
+        value = data.get(str(i))
+        if not isinstance(value, str) or not value.strip():
+            return None
+        results.append(value)
+    return results
+
+
+class TranslationBatcher:
+    """
+    将短时间内到达的翻译请求合并为一次API调用：各段文本编号后作为一个JSON对象发送，要求模型按编号返回JSON，
+    再把结果分发给各个调用方。只合并API地址、模型和提示词都相同的请求；
+    结果无法解析时退回为逐条请求，因此不会比不合并更差。
+    """
+
+    def __init__(self, window: float = 0.05, max_size: int = 8):
+        """
+        :param window: 第一条请求到达后最多等待多少秒收集其他请求。
+        :param max_size: 单次合并的最大条数，达到后立即发送。
+        """
+        self.window = max(0.0, window)
+        self.max_size = max(1, max_size)
+        self._pending: Dict[Tuple, _PendingBatch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_texts = 0
+        self.fallbacks = 0
+
+    async def translate(
+        self, text: str, http_client: httpx.AsyncClient, base_url: str, api_key: str,
+        model: str, api_format: str, system_prompt: str, timeout: float = 120.0,
+    ) -> Optional[str]:
+        """加入当前批次并等待结果；调用方被取消时其文本不再发送（已发送则忽略结果）"""
+        loop = asyncio.get_running_loop()
+        key = (base_url, api_key, model, api_format, system_prompt)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch()
+            batch.timer = loop.call_later(self.window, self._flush, key, http_client)
+        future = loop.create_future()
+        batch.items.append((text, future, timeout))
+        if len(batch.items) >= self.max_size:
+            self._flush(key, http_client)
+        return await future
+
+    def _flush(self, key: Tuple, http_client: httpx.AsyncClient):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._send(key, batch.items, http_client))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, key: Tuple, items: List[Tuple[str, asyncio.Future, float]], http_client: httpx.AsyncClient):
+        base_url, api_key, model, api_format, system_prompt = key
+        items = [item for item in items if not item[1].done()]
+        if not items:
+            return
+        try:
+            if len(items) == 1:
+                text, future, timeout = items[0]
+                self._resolve(future, await _request_translation(
+                    text, http_client, base_url, api_key, model, api_format, system_prompt, timeout
+                ))
+                return
+
+            self.batches += 1
+            self.batched_texts += len(items)
+            segments = json.dumps({str(i): text for i, (text, _, _) in enumerate(items, 1)}, ensure_ascii=False)
+            content = await _request_translation(
+                segments, http_client, base_url, api_key, model, api_format, system_prompt + BATCH_INSTRUCTION,
+                max(timeout for _, _, timeout in items),
+            )
+            results = _parse_batch_response(content, len(items))
+            if results is not None:
+                for (_, future, _), result in zip(items, results):
+                    self._resolve(future, result)
+                return
+
+            self.fallbacks += 1
+            logger.warning(f"无法解析合并翻译的结果，改为逐条请求 {len(items)} 段文本。")
+            pending = [(text, future, timeout) for text, future, timeout in items if not future.done()]
+            results = await asyncio.gather(*(
+                _request_translation(text, http_client, base_url, api_key, model, api_format, system_prompt, timeout)
+                for text, _, timeout in pending
+            ))
+            for (_, future, _), result in zip(pending, results):
+                self._resolve(future, result)
+        except asyncio.CancelledError:
+            for _, future, _ in items:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Optional[str]):
+        if not future.done():
+            future.set_result(result)
+
+    async def close(self):
+        """取消等待中和进行中的合并请求"""
+        for batch in self._pending.values():
+            if batch.timer:
+                batch.timer.cancel()
+            for _, future, _ in batch.items:
+                future.cancel()
+        self._pending.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "batched_texts": self.batched_texts,
+            "fallbacks": self.fallbacks,
+            "pending": sum(len(batch.items) for batch in self._pending.values()),
+        }
+
+
+def _extract_stream_delta(data: dict, api_format: str) -> str:
+    """从一条流式响应事件中提取增量文本"""
+    if api_format == "openai":
+        choices = data.get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+async def stream_translate_text(
+    text: str, http_client: httpx.AsyncClient, api_config: dict, system_prompt_override: Optional[str] = None,
+    cache: Optional[TranslationCache] = None, deadline: Optional[Deadline] = None,
+    metrics: Optional[Metrics] = None,
+) -> AsyncIterator[str]:
+    """
+    以流式 (SSE) 方式进行翻译，逐段产出增量文本。参数与 translate_text 相同。
+    deadline 只用于限制单次读取的超时；整体的截止时间由消费文本流的合成流水线负责。
+    缓存命中时一次性产出完整结果；流正常结束后将完整译文写入缓存。
+    提供 metrics 时记录首个增量的等待时间 (translate_first_token) 和整个流的耗时 (translate)。
+    请求失败时抛出 TranslationStreamError，调用方据此放弃已产出的部分。
+    """
+    base_url = api_config.get("base_url")
+    api_key = api_config.get("api_key")
+    model = api_config.get("model", "gpt-3.5-turbo")
+    api_format = api_config.get("api_format", "openai")
+    system_prompt = system_prompt_override or api_config.get("prompt", "You are a translation assistant.")
+
+    if not all([base_url, api_key]):
+        raise TranslationStreamError("翻译API配置不完整 (base_url, api_key)。")
+
+    cache_key = None
+    if cache is not None:
+        cache_key = TranslationCache.make_key(api_format, model, system_prompt, text)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    request = _build_request(text, base_url, api_key, model, api_format, system_prompt, stream=True)
+    if not request:
+        raise TranslationStreamError(f"不支持的API格式: {api_format}")
+    endpoint_url, headers, payload = request
+
+    received = []
+    start_time = time.monotonic()
+    try:
+        timeout = (deadline or Deadline()).timeout(120.0)
+        async with http_client.stream("POST", endpoint_url, headers=headers, json=payload, timeout=timeout) as response:
+            if response.is_error:
+                await response.aread()
+                raise TranslationStreamError(f"HTTP {response.status_code}: {response.text}")
+            async for line in response.aiter_lines():
+                line = line.strip()
+                if not line.startswith("data:"):
+                    continue
+                data_str = line[len("data:"):].strip()
+                if data_str == "[DONE]":
+                    break
+                delta = _extract_stream_delta(json.loads(data_str), api_format)
+                if delta:
+                    if metrics and not received:
+                        metrics.observe("translate_first_token", time.monotonic() - start_time)
+                    received.append(delta)
+                    yield delta
+    except TranslationStreamError:
+        if metrics:
+            metrics.observe("translate", time.monotonic() - start_time, error=True)
+        raise
+    except Exception as e:
+        if metrics:
+            metrics.observe("translate", time.monotonic() - start_time, error=True)
+        raise TranslationStreamError(f"流式翻译请求失败: {e}") from e
+
+    if metrics:
+        metrics.observe("translate", time.monotonic() - start_time)
+
+    if cache_key and received:
+        cache.put(cache_key, "".join(received))
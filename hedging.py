@@ -0,0 +1,64 @@
+import math
+from collections import deque
+from typing import Dict, Optional
+
+
+class HedgePolicy:
+    """
+    请求对冲策略：根据最近的分块合成耗时计算对冲延迟（指定百分位），
+    并限制同时进行的对冲请求数量，避免额外负载失控。
+    """
+
+    def __init__(
+        self, percentile: float = 95.0, min_delay: float = 1.0, max_extra_inflight: int = 2,
+        window: int = 100, min_samples: int = 10,
+    ):
+        """
+        :param percentile: 使用最近耗时的第几百分位作为对冲延迟。
+        :param min_delay: 对冲延迟的下限（秒）。
+        :param max_extra_inflight: 全局同时进行的对冲请求上限。
+        :param window: 参与统计的最近样本数。
+        :param min_samples: 样本数不足时不进行对冲。
+        """
+        self.percentile = min(max(percentile, 0.0), 100.0)
+        self.min_delay = min_delay
+        self.max_extra_inflight = max_extra_inflight
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._extra_inflight = 0
+        self.hedges_issued = 0
+        self.hedges_won = 0
+
+    def record(self, latency: float):
+        """记录一次成功合成的耗时"""
+        self._latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """返回当前的对冲延迟；样本不足时返回 None"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        rank = max(0, math.ceil(self.percentile / 100.0 * len(ordered)) - 1)
+        return max(self.min_delay, ordered[rank])
+
+    def try_acquire(self) -> bool:
+        """申请发出一个对冲请求，超过全局上限时返回 False"""
+        if self._extra_inflight >= self.max_extra_inflight:
+            return False
+        self._extra_inflight += 1
+        self.hedges_issued += 1
+        return True
+
+    def release(self, won: bool):
+        self._extra_inflight = max(0, self._extra_inflight - 1)
+        if won:
+            self.hedges_won += 1
+
+    def stats(self) -> Dict:
+        return {
+            "samples": len(self._latencies),
+            "delay": self.delay(),
+            "hedges_issued": self.hedges_issued,
+            "hedges_won": self.hedges_won,
+            "extra_inflight": self._extra_inflight,
+        }
@@ -1,18 +1,29 @@
 import asyncio
 import httpx
+import os
 import re
-from typing import Dict, Optional, Set
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-from astrbot.api.event import filter, AstrMessageEvent
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register, StarTools
 from astrbot.api import logger, AstrBotConfig
 import astrbot.api.message_components as Comp
 from astrbot.api.provider import LLMResponse
 
 # 从新模块导入功能
+from .admission import PRIORITY_HIGH, PRIORITY_NORMAL, AdmissionRejected
+from .audio_cache import AudioCache
+from .audio_io import AudioIOExecutor
+from .deadline import Deadline
+from .emotion_classifier import (
+    SOURCE_DEFAULT, SOURCE_FAILED, SOURCE_FALLBACK, SOURCE_LLM, SOURCE_LOCAL, EmotionClassifier,
+)
 from .emotion_manager import EmotionManager
+from .session_store import MODE_AUTO, MODE_FIXED, MODE_OFF, SessionState, SessionStore
 from .tts_engine import TTSEngine
-from .external_apis import translate_text
+from .external_apis import TranslationBatcher, stream_translate_text, translate_text
+from .metrics import write_dump
+from .translation_cache import TranslationCache
 
 
 @register(
@@ -26,21 +37,211 @@ class LlmTtsPlugin(Star):
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.config = config
-        self.active_sessions: Set[str] = set()
-        self.w_active_sessions: Set[str] = set()
-        self.session_emotions: Dict[str, Dict[str, str]] = {}
-        self.session_w_settings: Dict[str, Dict[str, str]] = {}
 
         # 初始化辅助模块
         plugin_data_dir = StarTools.get_data_dir("astrbot_plugin_tts_llm")
+        # 各会话的模式和角色、感情设置，重启后保留
+        self.sessions = SessionStore(
+            plugin_data_dir / "sessions.db",
+            max_cached=int(self.config.get("session_cache_size", 5000)),
+            idle_days=float(self.config.get("session_idle_days", 30)),
+        )
         emotions_file_path = plugin_data_dir / "emotions.json"
         self.emotion_manager = EmotionManager(emotions_file_path)
+        self.emotion_classifier: Optional[EmotionClassifier] = None
+        if self.config.get("enable_local_emotion_classifier", True):
+            # 关键词文件与 emotions.json 放在一起，不存在时只作为LLM标签无效时的兜底（使用默认情感）
+            self.emotion_classifier = EmotionClassifier(
+                plugin_data_dir / "emotion_keywords.json",
+                min_hits=int(self.config.get("local_emotion_min_hits", 2)),
+                min_confidence=float(self.config.get("local_emotion_confidence", 0.6)),
+            )
         
-        self.http_client = httpx.AsyncClient(timeout=300.0)
-        self.tts_engine = TTSEngine(self.config, self.http_client)
+        # 音频文件读写统一在专用线程池中执行，不阻塞事件循环
+        self.audio_io = AudioIOExecutor(int(self.config.get("audio_io_workers", 2)))
+        audio_cache = None
+        if self.config.get("enable_audio_cache", True):
+            audio_cache = AudioCache(
+                plugin_data_dir / "audio_cache",
+                max_bytes=int(self.config.get("audio_cache_max_mb", 256)) * 1024 * 1024,
+                max_entries=int(self.config.get("audio_cache_max_entries", 2000)),
+                io_executor=self.audio_io,
+            )
+
+        self.translation_cache: Optional[TranslationCache] = None
+        if self.config.get("enable_translation_cache", True):
+            self.translation_cache = TranslationCache(
+                max_entries=int(self.config.get("translation_cache_max_entries", 1000)),
+                persist_path=(plugin_data_dir / "translation_cache.json"
+                              if self.config.get("translation_cache_persist", True) else None),
+            )
+
+        self.translation_batcher: Optional[TranslationBatcher] = None
+        if self.config.get("enable_translation_batching", False):
+            self.translation_batcher = TranslationBatcher(
+                window=float(self.config.get("translation_batch_window_ms", 50)) / 1000.0,
+                max_size=int(self.config.get("translation_batch_max_size", 8)),
+            )
+
+        self.http_client = self._create_http_client()
+        self.tts_engine = TTSEngine(self.config, self.http_client, audio_cache, self.audio_io)
+
+        try:
+            # 监视感情文件，插件外部的修改无需重载插件即可生效
+            self.emotion_manager.start_watching()
+        except RuntimeError:
+            logger.warning("当前没有运行中的事件循环，感情文件的外部修改需重载插件后生效。")
+
+        self._warmup_task: Optional[asyncio.Task] = None
+        if self.config.get("enable_warmup", True):
+            try:
+                # 在后台预热，不阻塞插件加载
+                self._warmup_task = asyncio.get_running_loop().create_task(self._warm_up())
+            except RuntimeError:
+                logger.warning("当前没有运行中的事件循环，跳过TTS服务器预热。")
+
+        self._metrics_task: Optional[asyncio.Task] = None
+        dump_format = self.config.get("metrics_dump_format", "off")
+        if dump_format in ("json", "prometheus"):
+            suffix = "json" if dump_format == "json" else "prom"
+            dump_path = str(plugin_data_dir / f"metrics.{suffix}")
+            try:
+                self._metrics_task = asyncio.get_running_loop().create_task(
+                    self._dump_metrics_loop(dump_path, dump_format)
+                )
+            except RuntimeError:
+                logger.warning("当前没有运行中的事件循环，不导出统计数据。")
         
         logger.info("LLM TTS 插件已加载。")
 
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """按配置创建共享的HTTP客户端（连接池大小、长连接保持时间、HTTP/2）"""
+        limits = httpx.Limits(
+            max_connections=int(self.config.get("http_max_connections", 100)),
+            max_keepalive_connections=int(self.config.get("http_max_keepalive_connections", 20)),
+            keepalive_expiry=float(self.config.get("http_keepalive_expiry", 60)),
+        )
+        http2 = self.config.get("enable_http2", False)
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("未安装 h2 (pip install httpx[http2])，HTTP/2 未启用。")
+                http2 = False
+        return httpx.AsyncClient(timeout=300.0, limits=limits, http2=http2)
+
+    async def _warm_up(self):
+        """预热TTS服务器：建立连接，并预先设置默认角色的参考音频"""
+        references = []
+        char_name = self.config.get("default_character")
+        emotion_data = self.emotion_manager.get_emotion_data(char_name, self.config.get("default_emotion_name"))
+        if emotion_data:
+            references.append((char_name, emotion_data["ref_audio_path"], emotion_data["ref_audio_text"]))
+        synthesis_text = self.config.get("warmup_text", "") if self.config.get("warmup_synthesis", False) else None
+        try:
+            await self.tts_engine.warm_up(references, synthesis_text or None)
+        except Exception as e:
+            logger.warning(f"TTS服务器预热失败: {e}")
+
+    def _collect_stats(self) -> Dict:
+        stats = self.tts_engine.stats()
+        if self.translation_cache:
+            stats["translation_cache"] = self.translation_cache.stats()
+        if self.translation_batcher:
+            stats["translation_batcher"] = self.translation_batcher.stats()
+        stats["sessions"] = self.sessions.stats()
+        if self.emotion_classifier:
+            stats["emotion_classifier"] = self.emotion_classifier.stats()
+        return stats
+
+    async def _dump_metrics_loop(self, path: str, dump_format: str):
+        """定期将统计数据写入文件，供外部监控读取"""
+        interval = max(1.0, float(self.config.get("metrics_dump_interval_seconds", 60)))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.audio_io.run(write_dump, path, self._collect_stats(), dump_format)
+            except Exception as e:
+                logger.warning(f"导出统计数据失败: {e}")
+
+    @staticmethod
+    def _format_seconds(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.2f}s"
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("tts-stats", alias={"语音统计"})
+    async def stats_command(self, event: AstrMessageEvent):
+        """查看各阶段耗时分布和TTS服务器统计（仅管理员）"""
+        stats = self._collect_stats()
+        lines = ["📊 各阶段耗时 (次数 / 失败 / p50 / p90 / p99):"]
+        for stage, summary in sorted(stats["stages"].items()):
+            lines.append(
+                f"- {stage}: {summary['count']} / {summary['errors']} / "
+                f"{self._format_seconds(summary['p50'])} / {self._format_seconds(summary['p90'])} / "
+                f"{self._format_seconds(summary['p99'])}"
+            )
+        if not stats["stages"]:
+            lines.append("- 暂无数据")
+
+        health = {entry["url"]: entry for entry in stats["scheduler"]}
+        lines.append("\n🖥️ TTS服务器:")
+        for url, counters in stats["servers"].items():
+            cps = counters["chars_per_second"]
+            lines.append(
+                f"- {url} [{health.get(url, {}).get('state', '-')}]: 请求 {counters['requests']}，"
+                f"失败 {counters['failures']}，超时 {counters['timeouts']}，重试 {counters['retries']}，"
+                f"{counters['bytes'] / 1024 / 1024:.1f} MB，{'-' if cps is None else f'{cps:.1f}'} 字/秒"
+            )
+        if not stats["servers"]:
+            lines.append("- 暂无数据")
+
+        admission, hedging = stats["admission"], stats["hedging"]
+        lines.append(
+            f"\n🚦 准入: 进行中 {admission['active']}/{admission['capacity']}，排队 {admission['queued_total']}，"
+            f"拒绝 {admission['rejected']}；对冲: 发出 {hedging['hedges_issued']}，胜出 {hedging['hedges_won']}"
+        )
+
+        memory, temp_audio = stats["memory"], stats["temp_audio"]
+        memory_limit = f"{memory['max'] / 1024 / 1024:.0f} MB" if memory["max"] > 0 else "不限"
+        lines.append(
+            f"🧠 音频内存: {memory['used'] / 1024 / 1024:.1f} MB / {memory_limit}"
+            f"（峰值 {memory['peak'] / 1024 / 1024:.1f} MB），转存到磁盘 {memory['spills']} 次；"
+            f"临时语音 {temp_audio['files']} 个，{temp_audio['bytes'] / 1024 / 1024:.1f} MB"
+        )
+        if "single_flight" in stats:
+            flights = stats["single_flight"]
+            lines.append(f"🔗 合并合成: 发起 {flights['leaders']}，合并 {flights['coalesced']}，进行中 {flights['inflight']}")
+        if "audio_cache" in stats:
+            cache = stats["audio_cache"]
+            lines.append(
+                f"💾 音频缓存: {cache['entries']} 条，{cache['bytes'] / 1024 / 1024:.1f} MB，"
+                f"命中 {cache['hits']}，未命中 {cache['misses']}，命中率 {cache['hit_rate']:.0%}"
+            )
+        if "translation_cache" in stats:
+            cache = stats["translation_cache"]
+            lines.append(
+                f"💾 翻译缓存: {cache['entries']} 条，命中 {cache['hits']}，未命中 {cache['misses']}，"
+                f"合并 {cache['coalesced']}，命中率 {cache['hit_rate']:.0%}"
+            )
+        if "translation_batcher" in stats:
+            batcher = stats["translation_batcher"]
+            lines.append(
+                f"📦 合并翻译: {batcher['batches']} 批共 {batcher['batched_texts']} 条，"
+                f"解析失败改为逐条 {batcher['fallbacks']} 次"
+            )
+        sessions = stats["sessions"]
+        lines.append(
+            f"👥 会话: 内存中 {sessions['cached']} 个（开启语音 {sessions['active']} 个），"
+            f"待保存 {sessions['dirty']}，从数据库加载 {sessions['loads']} 次"
+        )
+        if "emotion_classifier" in stats:
+            emotion = stats["emotion_classifier"]
+            lines.append(
+                f"🎭 情感识别: 本地 {emotion['local']}，LLM {emotion['llm']}，本地兜底 {emotion['fallback']}，"
+                f"默认情感 {emotion['default']}，失败 {emotion['failed']}"
+            )
+        yield event.plain_result("\n".join(lines))
+
     @filter.command("注册感情")
     async def register_emotion_command(
         self, event: AstrMessageEvent, character_name: str, emotion_name: str, ref_audio_path: str, ref_audio_text: str,
@@ -50,10 +251,10 @@ class LlmTtsPlugin(Star):
             yield event.plain_result("❌ 错误：参考音频路径无效。它必须是一个相对路径，且不能包含 '..'。" )
             return
 
-        if self.emotion_manager.register_emotion(character_name, emotion_name, ref_audio_path, ref_audio_text):
+        if await self.emotion_manager.register_emotion(character_name, emotion_name, ref_audio_path, ref_audio_text):
             yield event.plain_result(f"✅ 感情 '{emotion_name}' 已成功注册到角色 '{character_name}' 下。")
         else:
-            self.emotion_manager.reload()  # 如果保存失败，从文件重新加载以恢复状态
+            await self.emotion_manager.reload()  # 如果保存失败，从文件重新加载以恢复状态
             yield event.plain_result("❌ 保存感情时发生错误，注册失败。")
 
     @filter.command("删除感情")
@@ -67,10 +268,10 @@ class LlmTtsPlugin(Star):
             yield event.plain_result(f"❌ 错误：角色 '{character_name}' 下未找到名为 '{emotion_name}' 的感情。")
             return
 
-        if self.emotion_manager.delete_emotion(character_name, emotion_name):
+        if await self.emotion_manager.delete_emotion(character_name, emotion_name):
             yield event.plain_result(f"✅ 已成功删除角色 '{character_name}' 的感情 '{emotion_name}'。")
         else:
-            self.emotion_manager.reload() # 如果保存失败，从文件重新加载以恢复状态
+            await self.emotion_manager.reload() # 如果保存失败，从文件重新加载以恢复状态
             yield event.plain_result("❌ 保存文件时发生错误，删除失败。")
 
     @filter.command("查看感情")
@@ -108,6 +309,8 @@ class LlmTtsPlugin(Star):
             ref_audio_text=emotion_data["ref_audio_text"],
             text=text_to_synthesize,
             session_id_for_log=event.unified_msg_origin,
+            priority=PRIORITY_HIGH,
+            deadline=self._new_deadline(),
         )
 
         if audio_path:
@@ -119,8 +322,7 @@ class LlmTtsPlugin(Star):
     @filter.command("tts-llm", alias={"开启语音合成"})
     async def start_tts(self, event: AstrMessageEvent):
         session_id = event.unified_msg_origin
-        self.active_sessions.add(session_id)
-        self.w_active_sessions.discard(session_id)
+        await self.sessions.update(session_id, mode=MODE_FIXED)
         default_char = self.config.get("default_character")
         default_emotion = self.config.get("default_emotion_name")
         logger.info(f"会话 [{session_id}] 的 LLM TTS 功能已开启。")
@@ -129,16 +331,14 @@ class LlmTtsPlugin(Star):
     @filter.command("tts-q", alias={"关闭语音合成"})
     async def stop_tts(self, event: AstrMessageEvent):
         session_id = event.unified_msg_origin
-        self.active_sessions.discard(session_id)
-        self.w_active_sessions.discard(session_id)
+        await self.sessions.update(session_id, mode=MODE_OFF)
         logger.info(f"会话 [{session_id}] 的所有 LLM TTS 功能已关闭。")
         yield event.plain_result("⏹️ 本对话的所有LLM语音合成功能已关闭。")
 
     @filter.command("tts-w", alias={"开启自动情感识别"})
     async def start_tts_w(self, event: AstrMessageEvent):
         session_id = event.unified_msg_origin
-        self.w_active_sessions.add(session_id)
-        self.active_sessions.discard(session_id)
+        await self.sessions.update(session_id, mode=MODE_AUTO)
         default_char = self.config.get("default_character")
         logger.info(f"会话 [{session_id}] 的 LLM 自动情感识别 TTS 功能已开启。")
         yield event.plain_result(f"▶️ 本对话的自动情感识别语音合成已开启。\n将使用默认角色: {default_char}")
@@ -146,14 +346,15 @@ class LlmTtsPlugin(Star):
     @filter.command("tts-w-q", alias={"关闭自动情感识别"})
     async def stop_tts_w(self, event: AstrMessageEvent):
         session_id = event.unified_msg_origin
-        self.w_active_sessions.discard(session_id)
+        if (await self.sessions.get(session_id)).mode == MODE_AUTO:
+            await self.sessions.update(session_id, mode=MODE_OFF)
         logger.info(f"会话 [{session_id}] 的 LLM 自动情感识别 TTS 功能已关闭。")
         yield event.plain_result("⏹️ 本对话的自动情感识别语音合成已关闭。")
 
     @filter.command("sw", alias={"切换感情"})
     async def switch_emotion(self, event: AstrMessageEvent, character_name: str, emotion_name: str):
         if self.emotion_manager.get_emotion_data(character_name, emotion_name):
-            self.session_emotions[event.unified_msg_origin] = {"character": character_name, "emotion": emotion_name}
+            await self.sessions.update(event.unified_msg_origin, character=character_name, emotion=emotion_name)
             logger.info(f"会话 [{event.unified_msg_origin}] 切换感情至: {character_name} - {emotion_name}")
             yield event.plain_result(f"本会话感情已切换为: {character_name} - {emotion_name}")
         else:
@@ -162,16 +363,15 @@ class LlmTtsPlugin(Star):
     @filter.command("sw-w", alias={"切换w角色"})
     async def switch_w_character(self, event: AstrMessageEvent, character_name: str):
         if self.emotion_manager.character_exists(character_name):
-            self.session_w_settings[event.unified_msg_origin] = {"character": character_name}
+            await self.sessions.update(event.unified_msg_origin, w_character=character_name)
             logger.info(f"会话 [{event.unified_msg_origin}] 切换自动情感识别角色至: {character_name}")
             yield event.plain_result(f"本会话自动情感识别角色已切换为: {character_name}")
         else:
             yield event.plain_result(f"❌ 未找到角色 '{character_name}'。")
 
-    async def _synthesize_speech_from_context(self, text: str, session_id: str) -> Optional[str]:
-        """根据当前会话设置合成语音（固定感情模式）"""
-        session_setting = self.session_emotions.get(session_id)
-        char_name, emotion_name = ((session_setting["character"], session_setting["emotion"]) if session_setting 
+    def _resolve_context_emotion(self, session_id: str, state: SessionState) -> Optional[tuple]:
+        """获取当前会话在固定感情模式下使用的角色名和感情数据"""
+        char_name, emotion_name = ((state.character, state.emotion) if state.character
                                    else (self.config.get("default_character"), self.config.get("default_emotion_name")))
         
         if not char_name or not emotion_name:
@@ -182,13 +382,115 @@ class LlmTtsPlugin(Star):
         if not emotion_data:
             logger.error(f"[{session_id}] 找不到感情配置: {char_name} - {emotion_name}")
             return None
-            
-        return await self.tts_engine.synthesize(
+        return char_name, emotion_data
+
+    def _parse_emotion_tag(
+        self, session_id: str, char_name: str, tagged_text: str, local_emotion: Optional[str],
+    ) -> Tuple[str, Optional[str], str]:
+        """
+        解析LLM译文末尾的 [情感] 标签，返回 (译文, 情感名, 来源)。
+        标签缺失或不是该角色的情感时，依次改用本地判断的结果和默认情感；都不可用时情感名为 None。
+        """
+        tagged_text = tagged_text.strip()
+        match = re.search(r'(.*)\[(.+?)\]\s*$', tagged_text, re.DOTALL)
+        if match:
+            japanese_text, emotion_name = match.group(1).strip(), match.group(2).strip()
+            if self.emotion_manager.get_emotion_data(char_name, emotion_name):
+                return japanese_text, emotion_name, SOURCE_LLM
+            logger.warning(f"[{session_id}] LLM返回的情感'{emotion_name}'无效，尝试兜底。")
+        else:
+            japanese_text, emotion_name = tagged_text, None
+            logger.warning(f"[{session_id}] LLM返回的译文缺少情感标签，尝试兜底。")
+
+        if local_emotion:
+            return japanese_text, local_emotion, SOURCE_FALLBACK
+        default_emotion = self.config.get("default_emotion_name")
+        if default_emotion and self.emotion_manager.get_emotion_data(char_name, default_emotion):
+            return japanese_text, default_emotion, SOURCE_DEFAULT
+        return japanese_text, emotion_name, SOURCE_FAILED
+
+    def _reply_priority(self, original_text: str) -> int:
+        """短回复优先合成，避免排在长回复的大量分块之后"""
+        if len(original_text) <= self.config.get("admission_short_reply_chars", 30):
+            return PRIORITY_HIGH
+        return PRIORITY_NORMAL
+
+    def _new_deadline(self) -> Deadline:
+        """一次回复（翻译 + 合成）的截止时间"""
+        return Deadline(self.config.get("reply_deadline_seconds", 90))
+
+    async def _synthesize_reply_audio(
+        self, event: AstrMessageEvent, char_name: str, emotion_data: Dict,
+        text: Optional[str] = None, text_stream: Optional[AsyncIterator[str]] = None,
+        priority: int = PRIORITY_NORMAL, deadline: Optional[Deadline] = None,
+    ) -> Tuple[Optional[str], int]:
+        """
+        合成回复语音，返回 (最后一段语音路径, 已提前发送的段数)。
+        启用渐进式发送时，开头已就绪的语音段会先单独发出，最后一段交由框架随回复一起发送。
+        """
+        synth_kwargs = dict(
             character_name=char_name,
             ref_audio_path=emotion_data["ref_audio_path"],
             ref_audio_text=emotion_data["ref_audio_text"],
-            text=text,
-            session_id_for_log=session_id,
+            session_id_for_log=event.unified_msg_origin,
+            priority=priority,
+            deadline=deadline,
+        )
+        progressive = self.config.get("enable_progressive_delivery", False) and (
+            text_stream is not None or self.config.get("enable_sentence_splitting", False)
+        )
+        if not progressive:
+            if text_stream is not None:
+                return await self.tts_engine.synthesize_stream(text_stream=text_stream, **synth_kwargs), 0
+            return await self.tts_engine.synthesize(text=text, **synth_kwargs), 0
+
+        if text_stream is not None:
+            segments = self.tts_engine.synthesize_stream_segments(text_stream=text_stream, **synth_kwargs)
+        else:
+            segments = self.tts_engine.synthesize_segments(text=text, **synth_kwargs)
+        sent = 0
+        try:
+            async for audio_path, is_last in segments:
+                if is_last:
+                    return audio_path, sent
+                with self.tts_engine.metrics.span("send"):
+                    await event.send(MessageChain(chain=[Comp.Record(file=audio_path)]))
+                sent += 1
+                logger.info(f"[{event.unified_msg_origin}] 已提前发送第 {sent} 段语音。")
+        finally:
+            await segments.aclose()
+        return None, sent
+
+    async def _synthesize_speech_from_context(
+        self, event: AstrMessageEvent, state: SessionState, text: str, priority: int = PRIORITY_NORMAL,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Optional[str], int]:
+        """根据当前会话设置合成语音（固定感情模式）"""
+        resolved = self._resolve_context_emotion(event.unified_msg_origin, state)
+        if not resolved:
+            return None, 0
+        char_name, emotion_data = resolved
+        return await self._synthesize_reply_audio(
+            event, char_name, emotion_data, text=text, priority=priority, deadline=deadline
+        )
+
+    async def _stream_speech_from_context(
+        self, event: AstrMessageEvent, state: SessionState, original_text: str, priority: int = PRIORITY_NORMAL,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Optional[str], int]:
+        """流式翻译并同时合成语音（固定感情模式），翻译出第一个完整分块时即开始合成"""
+        resolved = self._resolve_context_emotion(event.unified_msg_origin, state)
+        if not resolved:
+            return None, 0
+        char_name, emotion_data = resolved
+
+        api_config = self.config.get("translation_api", {})
+        text_stream = stream_translate_text(
+            original_text, self.http_client, api_config, cache=self.translation_cache, deadline=deadline,
+            metrics=self.tts_engine.metrics,
+        )
+        return await self._synthesize_reply_audio(
+            event, char_name, emotion_data, text_stream=text_stream, priority=priority, deadline=deadline
         )
 
     @filter.on_llm_response()
@@ -197,67 +499,139 @@ class LlmTtsPlugin(Star):
         original_text = resp.completion_text.strip()
         if not original_text:
             return
+        # 缓存命中时不访问磁盘
+        state = await self.sessions.touch(session_id)
+        if state.mode == MODE_OFF:
+            return
+
+        priority = self._reply_priority(original_text)
+        # 在翻译之前判断，服务器过载时直接退回纯文本，不再消耗翻译请求
+        try:
+            self.tts_engine.admission.check(session_id, priority)
+        except AdmissionRejected as e:
+            logger.warning(f"[{session_id}] 语音合成繁忙，跳过本次合成: {e}")
+            resp.result_chain.chain.append(Comp.Plain("\n(语音合成繁忙，本次仅发送文字)"))
+            return
 
+        with self.tts_engine.metrics.span("reply"):
+            await self._speak_llm_response(event, resp, state, original_text, priority)
+
+    async def _speak_llm_response(
+        self, event: AstrMessageEvent, resp: LLMResponse, state: SessionState, original_text: str, priority: int,
+    ):
+        """翻译并合成一条LLM回复，将结果写入 resp 的消息链"""
+        session_id = event.unified_msg_origin
         audio_path: Optional[str] = None
-        
-        if session_id in self.w_active_sessions:
+        sent_segments = 0
+        # 翻译、合成和故障转移共用同一个截止时间，超时后发送已完成的部分
+        deadline = self._new_deadline()
+
+        if state.mode == MODE_AUTO:
             logger.info(f"[{session_id}] 捕获LLM文本，准备进行自动情感语音合成: {original_text}")
-            char_name = self.session_w_settings.get(session_id, {}).get("character") or self.config.get("default_character")
+            char_name = state.w_character or self.config.get("default_character")
 
             if not char_name or not self.emotion_manager.character_exists(char_name):
                 resp.result_chain.chain.append(Comp.Plain(f"\n(语音合成失败: 角色'{char_name}'未配置或无感情)"))
                 return
             
-            character_emotions = self.emotion_manager.emotions_data[char_name]
             api_config = self.config.get("translation_api", {})
-            w_prompt_template = api_config.get("w_mode_prompt")
-            
-            if not w_prompt_template:
-                resp.result_chain.chain.append(Comp.Plain("\n(语音合成失败: 缺少提示词配置)"))
-                return
-
-            emotion_list_str = ", ".join(character_emotions.keys())
-            augmented_prompt = w_prompt_template.format(emotion_list=emotion_list_str, text=original_text)
-            
-            japanese_text_with_emotion = await translate_text(augmented_prompt, self.http_client, api_config, w_prompt_template)
-            if not japanese_text_with_emotion:
-                resp.result_chain.chain.append(Comp.Plain("\n(翻译或情感识别失败)"))
-                return
-
-            match = re.search(r'(.*)\[(.+?)\]\s*$', japanese_text_with_emotion.strip(), re.DOTALL)
-            if not match:
-                resp.result_chain.chain.append(Comp.Plain("\n(语音合成失败: 无法解析情感)"))
-                return
-
-            japanese_text, emotion_name = match.group(1).strip(), match.group(2).strip()
+            candidates = self.emotion_manager.emotions_data.get(char_name, {})
+            local_emotion, confident = None, False
+            if self.emotion_classifier:
+                await self.emotion_classifier.maybe_reload()
+                local_emotion, confident = self.emotion_classifier.classify(original_text, candidates)
+
+            if confident:
+                # 本地判断足够可靠，只需普通翻译，省去LLM的情感分析
+                japanese_text = await translate_text(
+                    original_text, self.http_client, api_config, cache=self.translation_cache, deadline=deadline,
+                    metrics=self.tts_engine.metrics, batcher=self.translation_batcher,
+                )
+                if not japanese_text:
+                    resp.result_chain.chain.append(Comp.Plain("\n(翻译失败)"))
+                    return
+                emotion_name, source = local_emotion, SOURCE_LOCAL
+            else:
+                w_prompt_template = api_config.get("w_mode_prompt")
+                if not w_prompt_template:
+                    resp.result_chain.chain.append(Comp.Plain("\n(语音合成失败: 缺少提示词配置)"))
+                    return
+
+                emotion_list_str = self.emotion_manager.emotion_list(char_name)
+                augmented_prompt = w_prompt_template.format(emotion_list=emotion_list_str, text=original_text)
+
+                japanese_text_with_emotion = await translate_text(
+                    augmented_prompt, self.http_client, api_config, w_prompt_template,
+                    cache=self.translation_cache, deadline=deadline, metrics=self.tts_engine.metrics,
+                )
+                if not japanese_text_with_emotion:
+                    resp.result_chain.chain.append(Comp.Plain("\n(翻译或情感识别失败)"))
+                    return
+
+                japanese_text, emotion_name, source = self._parse_emotion_tag(
+                    session_id, char_name, japanese_text_with_emotion, local_emotion
+                )
+                if source == SOURCE_FAILED or not japanese_text:
+                    if self.emotion_classifier:
+                        self.emotion_classifier.record(SOURCE_FAILED)
+                    reason = f"情感'{emotion_name}'无效" if emotion_name else "无法解析情感"
+                    resp.result_chain.chain.append(Comp.Plain(f"\n(语音合成失败: {reason})"))
+                    return
+
+            if self.emotion_classifier:
+                self.emotion_classifier.record(source)
             emotion_data = self.emotion_manager.get_emotion_data(char_name, emotion_name)
 
-            if not emotion_data:
-                resp.result_chain.chain.append(Comp.Plain(f"\n(语音合成失败: 情感'{emotion_name}'无效)"))
-                return
-
-            audio_path = await self.tts_engine.synthesize(
-                character_name=char_name, ref_audio_path=emotion_data["ref_audio_path"],
-                ref_audio_text=emotion_data["ref_audio_text"], text=japanese_text, session_id_for_log=session_id
+            audio_path, sent_segments = await self._synthesize_reply_audio(
+                event, char_name, emotion_data, text=japanese_text, priority=priority, deadline=deadline
             )
 
-        elif session_id in self.active_sessions:
+        elif state.mode == MODE_FIXED:
             logger.info(f"[{session_id}] 捕获LLM文本，准备语音合成: {original_text}")
-            api_config = self.config.get("translation_api", {})
-            japanese_text = await translate_text(original_text, self.http_client, api_config)
-            if not japanese_text:
-                resp.result_chain.chain.append(Comp.Plain("\n(翻译失败)"))
-                return
-            audio_path = await self._synthesize_speech_from_context(japanese_text, session_id)
+            if self.config.get("enable_streaming_translation", False):
+                audio_path, sent_segments = await self._stream_speech_from_context(
+                    event, state, original_text, priority, deadline
+                )
+            else:
+                api_config = self.config.get("translation_api", {})
+                japanese_text = await translate_text(
+                    original_text, self.http_client, api_config, cache=self.translation_cache, deadline=deadline,
+                    metrics=self.tts_engine.metrics, batcher=self.translation_batcher,
+                )
+                if not japanese_text:
+                    resp.result_chain.chain.append(Comp.Plain("\n(翻译失败)"))
+                    return
+                audio_path, sent_segments = await self._synthesize_speech_from_context(
+                    event, state, japanese_text, priority, deadline
+                )
         
         if audio_path:
             resp.result_chain.chain = [Comp.Record(file=audio_path)]
-            if self.config.get("send_text_with_audio", False):
+            if self.config.get("send_text_with_audio", False) or deadline.expired():
+                # 超时时语音可能只包含开头部分，附上完整文字
                 resp.result_chain.chain.append(Comp.Plain(f"{original_text}"))
-        elif session_id in self.active_sessions or session_id in self.w_active_sessions:
-            resp.result_chain.chain.append(Comp.Plain("\n(语音合成失败)"))
+        elif sent_segments:
+            # 开头部分的语音已经发出，只有后续部分失败
+            resp.result_chain.chain = [Comp.Plain("(后续语音合成失败)")]
+            if self.config.get("send_text_with_audio", False):
+                resp.result_chain.chain.append(Comp.Plain(f"\n{original_text}"))
+        else:
+            reason = "语音合成超时" if deadline.expired() else "语音合成失败"
+            resp.result_chain.chain.append(Comp.Plain(f"\n({reason})"))
 
     async def terminate(self):
-        """插件卸载/停用时关闭http客户端"""
+        """插件卸载/停用时保存缓存并关闭http客户端"""
+        for task in (self._warmup_task, self._metrics_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if self.translation_cache:
+            await self.translation_cache.flush()
+        if self.translation_batcher:
+            await self.translation_batcher.close()
+        await self.emotion_manager.close()
+        await self.sessions.close()
+        await self.tts_engine.close()
+        self.audio_io.shutdown()
         await self.http_client.aclose()
         logger.info("LLM TTS 插件已卸载，HTTP客户端已关闭。")
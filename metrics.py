@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# 汇总时输出的百分位
+PERCENTILES = (50, 90, 99)
+
+
+class RollingHistogram:
+    """保留最近 window 个样本的耗时分布，按需计算百分位"""
+
+    def __init__(self, window: int = 512):
+        self._samples = deque(maxlen=max(1, window))
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, error: bool = False):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(0, math.ceil(p / 100.0 * len(ordered)) - 1)
+        return ordered[rank]
+
+    def summary(self) -> Dict:
+        result = {
+            "count": self.count,
+            "errors": self.errors,
+            "mean": self.total / self.count if self.count else None,
+        }
+        for p in PERCENTILES:
+            result[f"p{p}"] = self.percentile(p)
+        return result
+
+
+class ServerCounters:
+    """单个TTS服务器的请求计数"""
+
+    __slots__ = ("requests", "failures", "timeouts", "retries", "bytes", "chars", "seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.bytes = 0
+        self.chars = 0
+        self.seconds = 0.0
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "chars": self.chars,
+            "chars_per_second": self.chars / self.seconds if self.seconds else None,
+        }
+
+
+class Metrics:
+    """
+    各处理阶段（翻译、设置参考音频、合成、合并、编码、发送等）的耗时分布和每台TTS服务器的计数。
+    只在事件循环中更新，无需加锁。
+    """
+
+    def __init__(self, window: int = 512):
+        """:param window: 每个阶段用于计算百分位的最近样本数。"""
+        self.window = window
+        self.started_at = time.time()
+        self._stages: Dict[str, RollingHistogram] = {}
+        self._servers: Dict[str, ServerCounters] = {}
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            histogram = self._stages[stage] = RollingHistogram(self.window)
+        histogram.observe(seconds, error)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """记录 with 块的耗时；块内抛出异常（包括被取消）时计为一次错误"""
+        start_time = time.monotonic()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.observe(stage, time.monotonic() - start_time, error)
+
+    def server(self, url: str) -> ServerCounters:
+        counters = self._servers.get(url)
+        if counters is None:
+            counters = self._servers[url] = ServerCounters()
+        return counters
+
+    def record_request(
+        self, url: str, seconds: float, chars: int = 0, nbytes: int = 0, failed: bool = False, timed_out: bool = False,
+    ):
+        """记录一次合成请求的结果"""
+        counters = self.server(url)
+        counters.requests += 1
+        if failed:
+            counters.failures += 1
+        elif timed_out:
+            counters.timeouts += 1
+        else:
+            counters.bytes += nbytes
+            counters.chars += chars
+            counters.seconds += seconds
+
+    def snapshot(self) -> Dict:
+        return {
+            "uptime": time.time() - self.started_at,
+            "stages": {stage: histogram.summary() for stage, histogram in self._stages.items()},
+            "servers": {url: counters.summary() for url, counters in self._servers.items()},
+        }
+
+
+def _prometheus_name(*parts: str) -> str:
+    name = "_".join(part for part in parts if part)
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+def _flatten(prefix: str, value, labels: str, lines: List[str]):
+    if isinstance(value, bool):
+        lines.append(f"{prefix}{labels} {int(value)}")
+    elif isinstance(value, (int, float)):
+        lines.append(f"{prefix}{labels} {value}")
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(_prometheus_name(prefix, str(key)), item, labels, lines)
+
+
+def to_prometheus(snapshot: Dict, namespace: str = "tts_llm") -> str:
+    """将 stats 快照转换为 Prometheus 文本格式；阶段和服务器作为标签，其余组件按字段展开"""
+    lines = []
+    for stage, summary in snapshot.get("stages", {}).items():
+        for key, value in summary.items():
+            if value is None:
+                continue
+            if key.startswith("p") and key[1:].isdigit():
+                quantile = int(key[1:]) / 100.0
+                lines.append(
+                    f'{namespace}_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {value}'
+                )
+            else:
+                lines.append(f'{namespace}_stage_{key}{{stage="{stage}"}} {value}')
+    for url, summary in snapshot.get("servers", {}).items():
+        _flatten(f"{namespace}_server", summary, f'{{server="{url}"}}', lines)
+    for name, component in snapshot.items():
+        if name in ("stages", "servers"):
+            continue
+        if isinstance(component, list):
+            # 例如调度器的服务器列表，以 url 作为标签
+            for entry in component:
+                labels = f'{{server="{entry.get("url", "")}"}}'
+                _flatten(_prometheus_name(namespace, name), {k: v for k, v in entry.items() if k != "url"},
+                         labels, lines)
+        else:
+            _flatten(_prometheus_name(namespace, name), component, "", lines)
+    return "\n".join(lines) + "\n"
+
+
+def write_dump(path: str, snapshot: Dict, fmt: str = "json"):
+    """将快照写入文件（先写临时文件再替换，阻塞操作，应在线程中调用）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if fmt == "prometheus":
+            f.write(to_prometheus(snapshot))
+        else:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
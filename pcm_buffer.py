@@ -0,0 +1,208 @@
+import functools
+import os
+import uuid
+import wave
+from typing import List, Optional
+
+from astrbot.api import logger
+
+from .audio_io import AudioIOExecutor
+from .audio_join import ChunkJoiner
+
+# 从磁盘复制音频时每次读取的字节数
+READ_BLOCK_BYTES = 1 << 20
+
+
+class MemoryBudget:
+    """所有合成中的分块音频共享的内存额度，超出额度的分块会转存到磁盘"""
+
+    def __init__(self, max_bytes: int):
+        """:param max_bytes: 内存中保留的PCM数据总量上限（字节），<=0 表示不限制。"""
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.peak = 0
+        self.spills = 0
+
+    def reserve(self, size: int) -> bool:
+        if self.max_bytes > 0 and self.used + size > self.max_bytes:
+            return False
+        self.used += size
+        self.peak = max(self.peak, self.used)
+        return True
+
+    def release(self, size: int):
+        self.used = max(0, self.used - size)
+
+    def stats(self) -> dict:
+        return {"used": self.used, "peak": self.peak, "max": self.max_bytes, "spills": self.spills}
+
+
+class PcmChunk:
+    """
+    一个分块的原始PCM音频。数据默认保存在内存中，内存额度不足时整块转存为磁盘上的临时文件；
+    也可以直接引用一个已有的WAV文件（例如缓存文件），此时不持有该文件。
+    网络数据块的边界不一定与采样帧对齐，不足一帧的尾部字节会留到下一次追加时一并写入。
+    接收完毕后数据只读，可由多个使用者共享：每个使用者通过 share 增加引用，用完后各自调用 discard。
+    """
+
+    def __init__(
+        self, budget: Optional[MemoryBudget], spill_dir: Optional[str], io: Optional[AudioIOExecutor],
+        frame_bytes: int = 2,
+    ):
+        self._budget = budget
+        self._spill_dir = spill_dir
+        self._io = io
+        self.frame_bytes = max(1, frame_bytes)
+        self._carry = b""
+        self._buffer = bytearray()
+        self._reserved = 0
+        self._spill_path: Optional[str] = None
+        self._spill_file = None
+        self.wav_path: Optional[str] = None
+        self.nbytes = 0
+        self._refs = 1
+
+    @classmethod
+    def from_wav(cls, path: str) -> "PcmChunk":
+        """引用一个已有的WAV文件"""
+        chunk = cls(None, None, None)
+        chunk.wav_path = path
+        return chunk
+
+    async def append(self, data: bytes):
+        """追加一段PCM数据，只写入完整的采样帧"""
+        if self._carry:
+            data = self._carry + data
+        aligned = len(data) - len(data) % self.frame_bytes
+        data, self._carry = data[:aligned], data[aligned:]
+        if not data:
+            return
+        if self._spill_file is None and self._budget.reserve(len(data)):
+            self._buffer += data
+            self._reserved += len(data)
+        else:
+            if self._spill_file is None:
+                await self._spill()
+            await self._io.run(self._spill_file.write, data)
+        self.nbytes += len(data)
+
+    async def _spill(self):
+        """将已缓冲的数据写入临时文件，之后的数据直接追加到文件中"""
+        await self._io.run(functools.partial(os.makedirs, self._spill_dir, exist_ok=True))
+        self._spill_path = os.path.join(self._spill_dir, f"{uuid.uuid4()}.pcm")
+        self._spill_file = await self._io.run(open, self._spill_path, "wb")
+        if self._buffer:
+            await self._io.run(self._spill_file.write, self._buffer)
+        self._buffer = bytearray()
+        self._budget.release(self._reserved)
+        self._reserved = 0
+        self._budget.spills += 1
+        logger.debug(f"音频内存额度不足，分块转存到磁盘: {self._spill_path}")
+
+    async def finish(self):
+        """数据接收完毕，丢弃不足一帧的残余字节"""
+        if self._carry:
+            logger.warning(f"音频流长度不是采样帧的整数倍，丢弃末尾 {len(self._carry)} 字节。")
+            self._carry = b""
+        if self._spill_file is not None:
+            await self._io.run(self._spill_file.close)
+
+    def frame_count(self) -> int:
+        """采样帧总数（阻塞操作，引用WAV文件时需读取文件头）"""
+        if self.wav_path:
+            with wave.open(self.wav_path, "rb") as wf_in:
+                return wf_in.getnframes()
+        return self.nbytes // self.frame_bytes
+
+    def read_frames(self, start: int, end: int) -> bytes:
+        """读取 [start, end) 范围内的采样帧（阻塞操作，应在线程中调用）"""
+        if end <= start:
+            return b""
+        if self.wav_path:
+            with wave.open(self.wav_path, "rb") as wf_in:
+                wf_in.setpos(start)
+                return wf_in.readframes(end - start)
+        if self._spill_path:
+            with open(self._spill_path, "rb") as f:
+                f.seek(start * self.frame_bytes)
+                return f.read((end - start) * self.frame_bytes)
+        return bytes(memoryview(self._buffer)[start * self.frame_bytes:end * self.frame_bytes])
+
+    def write_frames(self, wf: wave.Wave_write, start: int = 0, end: Optional[int] = None):
+        """将 [start, end) 范围内的采样帧写入已打开的WAV文件（阻塞操作，应在线程中调用）"""
+        if self.wav_path:
+            with wave.open(self.wav_path, "rb") as wf_in:
+                end = wf_in.getnframes() if end is None else end
+                frame_bytes = wf_in.getsampwidth() * wf_in.getnchannels()
+                frames_per_block = max(1, READ_BLOCK_BYTES // frame_bytes)
+                wf_in.setpos(start)
+                remaining = end - start
+                while remaining > 0:
+                    frames = wf_in.readframes(min(frames_per_block, remaining))
+                    if not frames:
+                        break
+                    wf.writeframes(frames)
+                    remaining -= len(frames) // frame_bytes
+        elif self._spill_path:
+            end = self.frame_count() if end is None else end
+            with open(self._spill_path, "rb") as f:
+                f.seek(start * self.frame_bytes)
+                remaining = (end - start) * self.frame_bytes
+                while remaining > 0:
+                    block = f.read(min(READ_BLOCK_BYTES, remaining))
+                    if not block:
+                        break
+                    wf.writeframes(block)
+                    remaining -= len(block)
+        else:
+            end = self.frame_count() if end is None else end
+            if end > start:
+                wf.writeframes(memoryview(self._buffer)[start * self.frame_bytes:end * self.frame_bytes])
+
+    def share(self):
+        """增加一个使用者"""
+        self._refs += 1
+
+    def discard(self):
+        """释放当前使用者的引用；最后一个使用者释放时归还内存额度并删除临时文件，引用的WAV文件不受影响"""
+        self._refs -= 1
+        if self._refs > 0:
+            return
+        if self._reserved:
+            self._budget.release(self._reserved)
+            self._reserved = 0
+        self._buffer = bytearray()
+        if self._spill_path:
+            # discard 可能在同步的清理代码中调用，文件操作交给线程池在后台完成
+            self._io.submit(_remove_spill_file, self._spill_file, self._spill_path)
+            self._spill_path = None
+            self._spill_file = None
+
+
+def _remove_spill_file(spill_file, path: str):
+    """关闭并删除转存的临时文件（阻塞操作）"""
+    try:
+        if spill_file is not None:
+            spill_file.close()
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除临时文件 {path} 失败: {e}")
+
+
+def write_wav(
+    path: str, chunks: List[PcmChunk], channels: int, sample_width: int, sample_rate: int,
+    joiner: Optional[ChunkJoiner] = None,
+):
+    """
+    将多个分块按顺序一次写入一个WAV文件（阻塞操作，应在线程中调用）。
+    提供 joiner 时由其处理分块边界（裁剪静音、停顿和淡入淡出），否则直接拼接。
+    """
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        if joiner and len(chunks) > 1:
+            joiner.write(wf, chunks)
+            return
+        for chunk in chunks:
+            chunk.write_frames(wf)
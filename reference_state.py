@@ -0,0 +1,88 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from astrbot.api import logger
+
+ReferenceKey = Tuple[str, str]
+
+
+class _ReferenceSlot:
+    """单个服务器上单个角色的参考音频状态"""
+
+    __slots__ = ("condition", "reference", "users", "switching")
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.reference: Optional[ReferenceKey] = None
+        self.users = 0
+        self.switching = False
+
+
+class ReferenceAudioTracker:
+    """
+    记录每个TTS服务器上各角色当前加载的参考音频，避免重复调用 /set_reference_audio。
+    同一参考音频的合成请求可以并发进行；切换参考音频时必须等待该角色上所有进行中的请求结束，
+    以免并发的worker在对方 /tts 途中替换参考音频。
+    """
+
+    def __init__(self):
+        self._slots: Dict[Tuple[str, str], _ReferenceSlot] = {}
+
+    def _get_slot(self, server_url: str, character_name: str) -> _ReferenceSlot:
+        key = (server_url, character_name)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = _ReferenceSlot()
+            self._slots[key] = slot
+        return slot
+
+    async def acquire(
+        self, server_url: str, character_name: str, reference: ReferenceKey,
+        setter: Callable[[], Awaitable[None]],
+    ) -> bool:
+        """
+        占用服务器上的参考音频。若当前加载的参考音频不匹配，则在无人使用时调用 setter 切换。
+        :return: 是否实际调用了 setter。setter 抛出的异常会原样向上传递。
+        """
+        slot = self._get_slot(server_url, character_name)
+        async with slot.condition:
+            while True:
+                if not slot.switching and slot.reference == reference:
+                    slot.users += 1
+                    return False
+                if not slot.switching and slot.users == 0:
+                    slot.switching = True
+                    break
+                await slot.condition.wait()
+
+        try:
+            await setter()
+        except BaseException:
+            async with slot.condition:
+                slot.switching = False
+                slot.reference = None
+                slot.condition.notify_all()
+            raise
+
+        async with slot.condition:
+            slot.switching = False
+            slot.reference = reference
+            slot.users += 1
+            slot.condition.notify_all()
+        return True
+
+    async def release(self, server_url: str, character_name: str, invalidate: bool = False):
+        """释放占用。invalidate 为 True 时（例如 /tts 失败）清除记录，下次将重新设置参考音频。"""
+        slot = self._get_slot(server_url, character_name)
+        async with slot.condition:
+            slot.users = max(0, slot.users - 1)
+            if invalidate:
+                slot.reference = None
+            slot.condition.notify_all()
+
+    def invalidate_server(self, server_url: str):
+        """清除某个服务器的全部参考音频记录（例如服务器疑似重启）"""
+        for (url, _), slot in self._slots.items():
+            if url == server_url and not slot.switching:
+                slot.reference = None
+        logger.debug(f"已清除服务器 {server_url} 的参考音频记录。")
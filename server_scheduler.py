@@ -0,0 +1,254 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from astrbot.api import logger
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class ServerHealth:
+    """单个TTS服务器的健康统计"""
+
+    __slots__ = (
+        "url", "successes", "failures", "consecutive_failures", "latency_ewma", "cps_ewma",
+        "state", "opened_at", "in_flight", "capacity", "slots", "trial_in_flight", "trial_started_at",
+    )
+
+    def __init__(self, url: str, capacity: int = 1):
+        self.url = url
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.cps_ewma: Optional[float] = None
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.in_flight = 0
+        self.capacity = max(1, capacity)
+        self.slots = asyncio.Semaphore(self.capacity)
+        # 半开状态下已放行的试探请求，结果记录前不再放行其他请求
+        self.trial_in_flight = False
+        self.trial_started_at = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        total = self.successes + self.failures
+        return self.successes / total if total else 1.0
+
+    def estimate_seconds(self, chars: int) -> float:
+        """估计在该服务器上合成指定字数所需的时间；没有历史数据时返回 0，使新服务器优先被探索"""
+        if self.cps_ewma:
+            return chars / self.cps_ewma
+        return self.latency_ewma or 0.0
+
+
+class ServerScheduler:
+    """
+    记录每个TTS服务器的成功率、延迟和合成速度 (EWMA)，为每次请求给出按预计耗时排序的候选服务器。
+    连续失败达到阈值时熔断该服务器，冷却后由后台任务探测，探测成功进入半开状态。
+    半开状态下只放行一个真实请求试探，成功后恢复，失败则重新熔断。
+    """
+
+    def __init__(
+        self, http_client: httpx.AsyncClient, failure_threshold: int = 3, open_seconds: float = 30.0,
+        ewma_alpha: float = 0.3, probe_interval: float = 5.0,
+        on_circuit_open: Optional[Callable[[str], None]] = None,
+        default_capacity: int = 1, capacity_overrides: Optional[Dict[str, int]] = None,
+    ):
+        """
+        :param failure_threshold: 连续失败多少次后熔断。
+        :param open_seconds: 熔断后等待多久开始探测。
+        :param on_circuit_open: 可选，服务器被熔断时的回调，参数为服务器地址。
+        :param default_capacity: 每个服务器默认允许同时处理的请求数。
+        :param capacity_overrides: 可选，按服务器地址单独指定的并发数。
+        """
+        self.http_client = http_client
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.ewma_alpha = ewma_alpha
+        self.probe_interval = probe_interval
+        self._servers: Dict[str, ServerHealth] = {}
+        self._rotation = 0
+        self._probe_task: Optional[asyncio.Task] = None
+        self.on_circuit_open = on_circuit_open
+        self.default_capacity = max(1, default_capacity)
+        self.capacity_overrides = {
+            self.normalize(url): max(1, int(capacity)) for url, capacity in (capacity_overrides or {}).items()
+        }
+
+    @staticmethod
+    def normalize(url: str) -> str:
+        return url.strip().strip("/")
+
+    def _get(self, url: str) -> ServerHealth:
+        health = self._servers.get(url)
+        if health is None:
+            health = ServerHealth(url, self.capacity_overrides.get(url, self.default_capacity))
+            self._servers[url] = health
+        return health
+
+    def _ensure_probing(self):
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    def unique_servers(self, servers: List[str]) -> List[str]:
+        """规范化并去重服务器地址"""
+        return list(dict.fromkeys(self.normalize(url) for url in servers if url and url.strip()))
+
+    def total_capacity(self, servers: List[str]) -> int:
+        """所有服务器的并发数之和"""
+        return sum(self._get(url).capacity for url in self.unique_servers(servers))
+
+    def available_capacity(self, servers: List[str]) -> int:
+        """未被熔断的服务器的并发数之和；全部熔断时返回总并发数"""
+        healthy = [self._get(url) for url in self.unique_servers(servers)]
+        return sum(health.capacity for health in healthy if health.state != CIRCUIT_OPEN) or self.total_capacity(servers)
+
+    def candidates(self, servers: List[str], chars: int = 0) -> List[str]:
+        """
+        返回本次请求应依次尝试的服务器列表：可用服务器按预计耗时（考虑排队情况和成功率）升序排列，
+        熔断中的服务器只在没有其他可用服务器时作为最后手段。
+        半开的服务器只在没有试探请求进行中时作为候选，并将本次请求记为试探；
+        试探超过熔断冷却时间仍未记录结果（例如列表中靠前的服务器已成功）时视为放弃。
+        """
+        self._ensure_probing()
+        urls = self.unique_servers(servers)
+        if not urls:
+            return []
+
+        # 轮换起点，使预计耗时相同的服务器之间分摊负载
+        offset = self._rotation % len(urls)
+        self._rotation += 1
+        rotated = urls[offset:] + urls[:offset]
+
+        now = time.monotonic()
+        available, tripped = [], []
+        for position, url in enumerate(rotated):
+            health = self._get(url)
+            if health.state == CIRCUIT_OPEN or (
+                health.state == CIRCUIT_HALF_OPEN and health.trial_in_flight
+                and now - health.trial_started_at < self.open_seconds
+            ):
+                tripped.append((health.opened_at, position, url))
+                continue
+            if health.state == CIRCUIT_HALF_OPEN:
+                health.trial_in_flight = True
+                health.trial_started_at = now
+            queue_rounds = 1 + health.in_flight // health.capacity
+            score = health.estimate_seconds(chars) * queue_rounds / max(health.success_rate, 0.1)
+            available.append((score, position, url))
+        ordered = [url for _, _, url in sorted(available)]
+        if not ordered:
+            ordered = [url for _, _, url in sorted(tripped)]
+        return ordered
+
+    async def acquire(self, url: str):
+        """占用服务器的一个并发名额，名额用尽时等待"""
+        health = self._get(url)
+        health.in_flight += 1
+        try:
+            await health.slots.acquire()
+        except BaseException:
+            health.in_flight -= 1
+            raise
+
+    def release(self, url: str):
+        health = self._get(url)
+        health.slots.release()
+        health.in_flight = max(0, health.in_flight - 1)
+
+    def is_idle(self, url: str) -> bool:
+        """服务器当前是否有空闲名额且未被熔断"""
+        health = self._get(url)
+        return health.in_flight < health.capacity and health.state != CIRCUIT_OPEN
+
+    def _ewma(self, previous: Optional[float], value: float) -> float:
+        if previous is None:
+            return value
+        return self.ewma_alpha * value + (1 - self.ewma_alpha) * previous
+
+    def record_success(self, url: str, latency: float, chars: int):
+        health = self._get(url)
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.trial_in_flight = False
+        health.latency_ewma = self._ewma(health.latency_ewma, latency)
+        if chars > 0 and latency > 0:
+            health.cps_ewma = self._ewma(health.cps_ewma, chars / latency)
+        if health.state != CIRCUIT_CLOSED:
+            logger.info(f"TTS服务器 {url} 已恢复，关闭熔断。")
+            health.state = CIRCUIT_CLOSED
+
+    def record_failure(self, url: str):
+        health = self._get(url)
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.trial_in_flight = False
+        if health.state == CIRCUIT_HALF_OPEN or (
+            health.state == CIRCUIT_CLOSED and health.consecutive_failures >= self.failure_threshold
+        ):
+            self._open(health)
+
+    def _open(self, health: ServerHealth):
+        health.state = CIRCUIT_OPEN
+        health.opened_at = time.monotonic()
+        logger.warning(
+            f"TTS服务器 {health.url} 连续失败 {health.consecutive_failures} 次，熔断 {self.open_seconds:.0f} 秒。"
+        )
+        if self.on_circuit_open:
+            self.on_circuit_open(health.url)
+
+    async def _probe(self, health: ServerHealth):
+        try:
+            response = await self.http_client.get(health.url, timeout=10.0)
+            alive = response.status_code < 500
+        except Exception as e:
+            logger.debug(f"探测TTS服务器 {health.url} 失败: {e}")
+            alive = False
+
+        if health.state != CIRCUIT_OPEN:
+            return
+        if alive:
+            logger.info(f"TTS服务器 {health.url} 探测成功，进入半开状态。")
+            health.state = CIRCUIT_HALF_OPEN
+        else:
+            health.opened_at = time.monotonic()
+
+    async def _probe_loop(self):
+        """后台探测处于熔断状态且冷却结束的服务器"""
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            now = time.monotonic()
+            due = [
+                health for health in self._servers.values()
+                if health.state == CIRCUIT_OPEN and now - health.opened_at >= self.open_seconds
+            ]
+            if due:
+                await asyncio.gather(*(self._probe(health) for health in due), return_exceptions=True)
+
+    async def close(self):
+        if self._probe_task:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+
+    def snapshot(self) -> List[Dict]:
+        """返回所有服务器的统计信息"""
+        return [
+            {
+                "url": health.url,
+                "state": health.state,
+                "success_rate": health.success_rate,
+                "successes": health.successes,
+                "failures": health.failures,
+                "latency_ewma": health.latency_ewma,
+                "chars_per_second": health.cps_ewma,
+                "in_flight": health.in_flight,
+                "capacity": health.capacity,
+            }
+            for health in self._servers.values()
+        ]
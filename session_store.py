@@ -0,0 +1,225 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+# 会话的语音合成模式
+MODE_OFF = 0
+MODE_FIXED = 1  # 固定感情模式 (/tts)
+MODE_AUTO = 2   # 自动情感识别模式 (/tts-w)
+
+
+class SessionState:
+    """单个会话的设置；未设置的角色和感情为 None，表示使用配置中的默认值"""
+
+    __slots__ = ("mode", "character", "emotion", "w_character", "last_used")
+
+    def __init__(
+        self, mode: int = MODE_OFF, character: Optional[str] = None, emotion: Optional[str] = None,
+        w_character: Optional[str] = None, last_used: float = 0.0,
+    ):
+        self.mode = mode
+        self.character = character
+        self.emotion = emotion
+        self.w_character = w_character
+        self.last_used = last_used
+
+    def is_default(self) -> bool:
+        return self.mode == MODE_OFF and self.character is None and self.emotion is None and self.w_character is None
+
+    def row(self, session_id: str) -> Tuple:
+        return session_id, self.mode, self.character, self.emotion, self.w_character, self.last_used
+
+
+class SessionStore:
+    """
+    各会话的模式、角色和感情设置，保存在 SQLite 中，重启后保留。
+    内存中只保留最近使用的有限个会话（LRU），首次访问时从数据库加载，之后的查询不访问磁盘。
+    修改合并后延迟写入；长时间未使用的会话从数据库中删除。
+    """
+
+    SAVE_DELAY_SECONDS = 1.0
+    # 开启了语音的会话每收到一条回复都会更新使用时间，间隔超过该值才需要写入
+    TOUCH_INTERVAL_SECONDS = 3600.0
+    PURGE_INTERVAL_SECONDS = 3600.0
+
+    def __init__(self, db_path, max_cached: int = 5000, idle_days: float = 30.0):
+        """
+        :param db_path: 数据库文件路径。
+        :param max_cached: 内存中保留的最大会话数。
+        :param idle_days: 超过该天数未使用的会话被清除，0 表示永久保留。
+        """
+        self.db_path = str(db_path)
+        self.max_cached = max(1, max_cached)
+        self.idle_seconds = max(0.0, idle_days) * 86400
+        self._cache: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._dirty: Dict[str, SessionState] = {}
+        # 正在写入数据库的修改，写入完成前读取同一会话时使用
+        self._writing: Dict[str, SessionState] = {}
+        self._save_task: Optional[asyncio.Task] = None
+        # 保证同一时刻只有一次写入，_writing 不会被并发的写入覆盖
+        self._flush_lock = asyncio.Lock()
+        self._purged_at = 0.0
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self._conn = self._connect()
+        if self.idle_seconds:
+            purged = self._write_rows([], [], time.time() - self.idle_seconds)
+            self._purged_at = time.time()
+            if purged:
+                logger.info(f"已清除 {purged} 个长时间未使用的会话设置。")
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, mode INTEGER NOT NULL, character TEXT, emotion TEXT, "
+            "w_character TEXT, last_used REAL NOT NULL)"
+        )
+        conn.commit()
+        return conn
+
+    def _is_idle(self, state: SessionState, now: float) -> bool:
+        return bool(self.idle_seconds) and now - state.last_used > self.idle_seconds
+
+    def _load_row(self, session_id: str) -> Optional[Tuple]:
+        """从数据库读取一个会话（阻塞操作）"""
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT mode, character, emotion, w_character, last_used FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+
+    def _write_rows(self, upserts: List[Tuple], deletes: List[Tuple], purge_before: Optional[float]) -> int:
+        """批量写入修改并清除长时间未使用的会话（阻塞操作），返回清除的会话数"""
+        with self._db_lock, self._conn:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sessions "
+                    "(session_id, mode, character, emotion, w_character, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    upserts,
+                )
+            if deletes:
+                self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", deletes)
+            if purge_before is None:
+                return 0
+            return self._conn.execute("DELETE FROM sessions WHERE last_used < ?", (purge_before,)).rowcount
+
+    def _remember(self, session_id: str, state: SessionState):
+        self._cache[session_id] = state
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.max_cached:
+            # 被淘汰的会话若有未保存的修改，仍保留在 _dirty 中直到写入
+            self._cache.popitem(last=False)
+
+    async def get(self, session_id: str) -> SessionState:
+        """返回会话的设置；不存在时返回默认设置（不写入数据库）。缓存命中时不访问磁盘"""
+        state = self._cache.get(session_id)
+        if state is not None:
+            self._cache.move_to_end(session_id)
+            self.hits += 1
+        else:
+            state = self._dirty.get(session_id) or self._writing.get(session_id)
+            if state is None:
+                self.loads += 1
+                try:
+                    row = await asyncio.to_thread(self._load_row, session_id)
+                except sqlite3.Error as e:
+                    logger.error(f"读取会话设置失败: {e}")
+                    row = None
+                # 等待期间其他调用方可能已经加载或修改了该会话
+                state = self._cache.get(session_id) or self._dirty.get(session_id) or self._writing.get(session_id)
+                if state is None:
+                    state = SessionState(*row) if row else SessionState()
+            self._remember(session_id, state)
+        if not state.is_default() and self._is_idle(state, time.time()):
+            logger.info(f"会话 [{session_id}] 长时间未使用，设置已重置。")
+            state = SessionState()
+            self._cache[session_id] = state
+            self._mark_dirty(session_id, state)
+        return state
+
+    async def touch(self, session_id: str) -> SessionState:
+        """获取会话设置并更新使用时间，用于收到LLM回复时"""
+        state = await self.get(session_id)
+        now = time.time()
+        if state.mode != MODE_OFF and now - state.last_used > self.TOUCH_INTERVAL_SECONDS:
+            state.last_used = now
+            self._mark_dirty(session_id, state)
+        return state
+
+    async def update(self, session_id: str, **changes) -> SessionState:
+        """修改会话设置（字段同 SessionState），延迟写入数据库"""
+        state = await self.get(session_id)
+        for name, value in changes.items():
+            setattr(state, name, value)
+        state.last_used = time.time()
+        self._mark_dirty(session_id, state)
+        return state
+
+    def _mark_dirty(self, session_id: str, state: SessionState):
+        self._dirty[session_id] = state
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._delayed_save())
+
+    async def _delayed_save(self):
+        await asyncio.sleep(self.SAVE_DELAY_SECONDS)
+        self._save_task = None
+        await self.flush()
+
+    async def flush(self):
+        """立即写入尚未保存的修改；前一次写入仍在进行时等待其完成"""
+        async with self._flush_lock:
+            await self._write_dirty()
+
+    async def _write_dirty(self):
+        dirty, self._dirty = self._dirty, {}
+        # 恢复为默认设置的会话直接删除，数据库中只保留有设置的会话
+        upserts = [state.row(session_id) for session_id, state in dirty.items() if not state.is_default()]
+        deletes = [(session_id,) for session_id, state in dirty.items() if state.is_default()]
+        now = time.time()
+        purge_before = None
+        if self.idle_seconds and now - self._purged_at > self.PURGE_INTERVAL_SECONDS:
+            purge_before = now - self.idle_seconds
+            self._purged_at = now
+        if not upserts and not deletes and purge_before is None:
+            return
+        self._writing = dirty
+        try:
+            purged = await asyncio.to_thread(self._write_rows, upserts, deletes, purge_before)
+        except sqlite3.Error as e:
+            logger.error(f"保存会话设置失败: {e}")
+            # 保留修改，下次保存时重试；期间的新修改优先
+            self._dirty = {**dirty, **self._dirty}
+            return
+        finally:
+            self._writing = {}
+        if purged:
+            logger.info(f"已清除 {purged} 个长时间未使用的会话设置。")
+
+    async def close(self):
+        """保存尚未写入的修改并关闭数据库"""
+        if self._save_task:
+            self._save_task.cancel()
+            await asyncio.gather(self._save_task, return_exceptions=True)
+            self._save_task = None
+        await self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def stats(self) -> Dict:
+        return {
+            "cached": len(self._cache),
+            "active": sum(1 for state in self._cache.values() if state.mode != MODE_OFF),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "loads": self.loads,
+        }
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight(Generic[T]):
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: "asyncio.Future[T]"):
+        self.future = future
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合并并发的相同任务：同一个键同时只执行一次，后到的调用方等待第一个调用方的结果。
+    结果是需要释放的资源（音频分块、临时文件）时，发起方在交付前为每个等待方调用一次 share 增加引用，
+    每个调用方用完后各自释放，因此一方释放不会影响仍在使用的其他方。
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(
+        self, key: Hashable, fn: Callable[[], Awaitable[T]],
+        share: Optional[Callable[[T], None]] = None, release: Optional[Callable[[T], None]] = None,
+    ) -> Tuple[T, bool]:
+        """
+        执行或等待 fn()，返回 (结果, 是否来自其他调用方)。
+        :param share: 为一个等待方增加结果的引用；结果为 None 时不调用。
+        :param release: 等待方在结果交付后被取消时，用于释放已为其增加的引用。
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            return await self._lead(key, fn, share), False
+
+        self.coalesced += 1
+        flight.waiters += 1
+        try:
+            # 使用 wait 而非直接 await，等待方被取消时不会连带取消发起方
+            await asyncio.wait({flight.future})
+        except asyncio.CancelledError:
+            if not flight.future.done():
+                flight.waiters -= 1
+            elif release and not flight.future.cancelled() and flight.future.exception() is None:
+                result = flight.future.result()
+                if result is not None:
+                    release(result)
+            raise
+        if flight.future.cancelled():
+            # 发起方被取消，由当前调用方重新发起
+            return await self.run(key, fn, share, release)
+        return flight.future.result(), True
+
+    async def _lead(self, key: Hashable, fn: Callable[[], Awaitable[T]], share: Optional[Callable[[T], None]]) -> T:
+        flight = self._flights[key] = _Flight(asyncio.get_running_loop().create_future())
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.future.cancel()
+            raise
+        except BaseException as e:
+            flight.future.set_exception(e)
+            # 避免无人等待时出现 "exception was never retrieved" 警告
+            flight.future.exception()
+            raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+        if share and result is not None:
+            for _ in range(flight.waiters):
+                share(result)
+        flight.future.set_result(result)
+        return result
+
+    def stats(self) -> Dict:
+        return {"inflight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
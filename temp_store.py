@@ -0,0 +1,182 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from astrbot.api import logger
+
+from .audio_io import AudioIOExecutor
+
+
+class TempAudioStore:
+    """
+    插件生成的临时音频文件（合成结果、编码结果、转存的分块）的统一管理。
+    记录由本插件创建的文件，后台任务按存活时间和目录总大小淘汰；启动时清理上次运行遗留的文件。
+    is_protected 返回 True 的文件（例如音频缓存中的文件）永远不会被删除。
+    同一个文件可以交给多个使用者（例如合并的相同合成任务）：acquire 增加一个使用者，
+    discard 只在最后一个使用者调用时才真正删除文件。
+    """
+
+    def __init__(
+        self, directory: str, ttl_seconds: float = 600, max_bytes: int = 512 * 1024 * 1024,
+        sweep_interval: float = 60, min_age_seconds: float = 30,
+        io_executor: Optional[AudioIOExecutor] = None, is_protected: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        :param directory: 临时文件目录，应为本插件独占。
+        :param ttl_seconds: 文件创建后保留的时间，<=0 表示不按时间淘汰。
+        :param max_bytes: 目录总大小上限，超出时从最旧的文件开始删除，<=0 表示不限制。
+        :param min_age_seconds: 按大小淘汰时，不删除比这更新的文件（可能仍在发送中）。
+        """
+        self.directory = os.path.abspath(directory)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.min_age_seconds = min_age_seconds
+        self.is_protected = is_protected
+        self._run_io = io_executor.run if io_executor else asyncio.to_thread
+        self._files: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._total_bytes = 0
+        # 使用者多于一个的文件及其使用者数
+        self._refs: Dict[str, int] = {}
+        self._gc_task: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.evicted = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._sweep_orphans()
+
+    def _sweep_orphans(self):
+        """删除上次运行遗留的所有文件（插件退出时仍在等待淘汰，或进程异常退出时写了一半的文件）"""
+        removed, freed = 0, 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path) or self._protected(path):
+                continue
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"清理遗留临时音频 {path} 失败: {e}")
+                continue
+            removed += 1
+            freed += size
+        if removed:
+            logger.info(f"已清理 {removed} 个遗留的临时音频文件，释放 {freed / 1024 / 1024:.1f} MB。")
+
+    def _protected(self, path: str) -> bool:
+        return bool(self.is_protected and self.is_protected(path))
+
+    def _ensure_gc(self):
+        if self._gc_task is None or self._gc_task.done():
+            self._gc_task = asyncio.create_task(self._gc_loop())
+
+    def new_path(self, suffix: str) -> str:
+        """生成一个新的临时文件路径。文件写入完成后应调用 track 登记。"""
+        self._ensure_gc()
+        return os.path.join(self.directory, f"{uuid.uuid4()}{suffix}")
+
+    async def track(self, path: str):
+        """登记一个已写入完成的文件，之后由本对象负责删除"""
+        path = os.path.abspath(path)
+        if self._protected(path) or path in self._files:
+            return
+        try:
+            size = await self._run_io(os.path.getsize, path)
+        except OSError:
+            return
+        self._files[path] = (time.monotonic(), size)
+        self._total_bytes += size
+        if self.max_bytes > 0 and self._total_bytes > self.max_bytes:
+            await self.sweep()
+
+    def acquire(self, path: Optional[str]):
+        """为一个已登记的文件增加一个使用者，并重新开始计算其存活时间"""
+        if not path:
+            return
+        path = os.path.abspath(path)
+        entry = self._files.get(path)
+        if entry is None:
+            return
+        self._refs[path] = self._refs.get(path, 1) + 1
+        self._files[path] = (time.monotonic(), entry[1])
+        self._files.move_to_end(path)
+
+    def release(self, path: Optional[str]) -> bool:
+        """减少一个使用者，不删除文件；返回是否仍有其他使用者"""
+        if not path:
+            return False
+        path = os.path.abspath(path)
+        refs = self._refs.get(path)
+        if not refs:
+            return False
+        if refs > 2:
+            self._refs[path] = refs - 1
+        else:
+            del self._refs[path]
+        return True
+
+    async def discard(self, path: Optional[str]):
+        """当前使用者不再需要该文件；没有其他使用者时立即删除（受保护的文件除外）"""
+        if not path:
+            return
+        path = os.path.abspath(path)
+        if self._protected(path) or self.release(path):
+            return
+        entry = self._files.pop(path, None)
+        if entry:
+            self._total_bytes -= entry[1]
+        try:
+            await self._run_io(os.remove, path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除临时文件 {path} 失败: {e}")
+
+    async def sweep(self):
+        """删除过期文件；总大小仍超出上限时，从最旧的文件开始删除"""
+        now = time.monotonic()
+        victims = []
+        for path, (created, size) in self._files.items():
+            age = now - created
+            if self.ttl_seconds > 0 and age >= self.ttl_seconds:
+                victims.append(path)
+                self.expired += 1
+        remaining = self._total_bytes - sum(self._files[path][1] for path in victims)
+        if self.max_bytes > 0 and remaining > self.max_bytes:
+            for path, (created, size) in self._files.items():
+                if remaining <= self.max_bytes or now - created < self.min_age_seconds:
+                    break
+                if path in victims:
+                    continue
+                victims.append(path)
+                remaining -= size
+                self.evicted += 1
+        for path in victims:
+            # 存活时间从最后一次交给使用者时算起，到期后不再等待使用者释放
+            self._refs.pop(path, None)
+            await self.discard(path)
+
+    async def _gc_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning(f"清理临时音频时出错: {e}")
+
+    async def close(self):
+        if self._gc_task:
+            self._gc_task.cancel()
+            await asyncio.gather(self._gc_task, return_exceptions=True)
+            self._gc_task = None
+
+    def stats(self) -> Dict:
+        return {
+            "files": len(self._files),
+            "shared": len(self._refs),
+            "bytes": self._total_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
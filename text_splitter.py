@@ -0,0 +1,156 @@
+import functools
+import math
+import re
+from typing import List, Pattern
+
+DEFAULT_SENTENCE_SPLIT_REGEX = r'([。、，！？,.!?])'
+
+
+@functools.lru_cache(maxsize=16)
+def _compile(regex_pattern: str) -> Pattern:
+    """缓存编译后的正则，避免每次切分都重新解析配置中的表达式"""
+    return re.compile(regex_pattern)
+
+
+def chunk_cost(text: str) -> int:
+    """估计一段文本的合成开销：合成耗时与有效字数近似成正比，空白不计入"""
+    return sum(1 for char in text if not char.isspace())
+
+
+def split_sentences(text: str, regex_pattern: str) -> List[str]:
+    """根据标点将文本切分为句子，标点保留在句子末尾，空句子会被丢弃"""
+    sentences = _compile(regex_pattern).split(text)
+    if not sentences:
+        return []
+
+    full_sentences = []
+    for i in range(0, len(sentences) - 1, 2):
+        sentence = sentences[i]
+        delimiter = sentences[i+1] if i+1 < len(sentences) else ""
+        if sentence:
+            full_sentences.append(sentence + delimiter)
+    if len(sentences) % 2 == 1 and sentences[-1]:
+        full_sentences.append(sentences[-1])
+    return full_sentences
+
+
+def _greedy_partition(costs: List[int], limit: int) -> List[int]:
+    """按顺序装箱，每块开销不超过 limit（单句超出时独占一块），返回各块的起始下标"""
+    starts, current = [0], 0
+    for i, cost in enumerate(costs):
+        if current and current + cost > limit:
+            starts.append(i)
+            current = 0
+        current += cost
+    return starts
+
+
+def balance_chunks(sentences: List[str], max_chunks: int, min_chars: int = 0, max_chars: int = 0) -> List[str]:
+    """
+    将句子按顺序合并为开销尽量均衡的文本块，使并行合成的总耗时不被最长的一块拖慢。
+    :param max_chunks: 期望的最大块数，通常为可用的服务器并发名额数。
+    :param min_chars: 每块的最小字数，过短的碎片会与相邻的块合并；<=0 表示不限制。
+    :param max_chars: 每块的最大字数，超出时即使超过 max_chunks 也会继续切分；<=0 表示不限制。
+                      单个句子超过该长度时不会在句中切开。
+    """
+    sentences = [sentence for sentence in sentences if chunk_cost(sentence) > 0] or sentences
+    if len(sentences) <= 1:
+        return ["".join(sentences)] if sentences else []
+
+    costs = [chunk_cost(sentence) for sentence in sentences]
+    total = sum(costs)
+    chunk_count = max(1, max_chunks)
+    if max_chars > 0:
+        chunk_count = max(chunk_count, math.ceil(total / max_chars))
+    if min_chars > 0:
+        chunk_count = min(chunk_count, max(1, total // min_chars))
+    chunk_count = min(chunk_count, len(sentences))
+
+    # 二分查找使块数不超过 chunk_count 的最小单块开销上限
+    low, high = max(costs), total
+    while low < high:
+        middle = (low + high) // 2
+        if len(_greedy_partition(costs, middle)) <= chunk_count:
+            high = middle
+        else:
+            low = middle + 1
+    starts = _greedy_partition(costs, low) + [len(sentences)]
+    groups = [(starts[i], starts[i + 1]) for i in range(len(starts) - 1)]
+
+    # 末尾可能残留过短的块，并入相邻块中较短的一侧
+    if min_chars > 0:
+        merged = True
+        while merged and len(groups) > 1:
+            merged = False
+            for i, (start, end) in enumerate(groups):
+                if sum(costs[start:end]) >= min_chars:
+                    continue
+                neighbours = [j for j in (i - 1, i + 1) if 0 <= j < len(groups)]
+                j = min(neighbours, key=lambda k: sum(costs[groups[k][0]:groups[k][1]]))
+                left, right = sorted((i, j))
+                combined = (groups[left][0], groups[right][1])
+                if max_chars > 0 and sum(costs[combined[0]:combined[1]]) > max_chars:
+                    continue
+                groups[left:right + 1] = [combined]
+                merged = True
+                break
+
+    return ["".join(sentences[start:end]) for start, end in groups]
+
+
+class StreamingSentenceSplitter:
+    """
+    增量式的句子切分器，用于流式翻译。
+    每次输入一段增量文本，返回已经完整（遇到句末标点）的文本块；切分结果与 split_sentences 一致。
+    一个块至少包含 sentences_per_chunk 个句子且不少于 min_chars 字，累计达到 max_chars 字时提前输出。
+    """
+
+    def __init__(self, regex_pattern: str, sentences_per_chunk: int, min_chars: int = 0, max_chars: int = 0):
+        self._regex = _compile(regex_pattern)
+        self._regex_pattern = regex_pattern
+        self.sentences_per_chunk = max(1, sentences_per_chunk)
+        self.min_chars = max(0, min_chars)
+        self.max_chars = max(0, max_chars)
+        self._buffer = ""
+        self._pending: List[str] = []
+
+    def _take_chunks(self) -> List[str]:
+        chunks = []
+        while self._pending:
+            count, chars = 0, 0
+            for sentence in self._pending:
+                count += 1
+                chars += chunk_cost(sentence)
+                if count >= self.sentences_per_chunk and chars >= self.min_chars:
+                    break
+                if self.max_chars and chars >= self.max_chars:
+                    break
+            else:
+                return chunks
+            chunks.append("".join(self._pending[:count]))
+            del self._pending[:count]
+        return chunks
+
+    def feed(self, delta: str) -> List[str]:
+        """输入增量文本，返回新产生的完整文本块"""
+        self._buffer += delta
+        last_end = 0
+        for match in self._regex.finditer(self._buffer):
+            last_end = match.end()
+        if last_end == 0:
+            return []
+
+        complete, self._buffer = self._buffer[:last_end], self._buffer[last_end:]
+        self._pending.extend(split_sentences(complete, self._regex_pattern))
+        return self._take_chunks()
+
+    def flush(self) -> List[str]:
+        """输入结束，返回剩余的所有文本"""
+        if self._buffer:
+            self._pending.extend(split_sentences(self._buffer, self._regex_pattern))
+            self._buffer = ""
+        chunks = self._take_chunks()
+        if self._pending:
+            chunks.append("".join(self._pending))
+            self._pending = []
+        return chunks
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from astrbot.api import logger
+
+from .single_flight import SingleFlight
+
+
+class TranslationCache:
+    """
+    翻译结果的有界LRU缓存，可选持久化到磁盘。
+    同时对并发的相同请求做合并（single-flight）：同一个键只会发出一次外部请求，其余调用方等待其结果。
+    """
+
+    SAVE_DELAY_SECONDS = 5.0
+
+    def __init__(self, max_entries: int, persist_path=None):
+        """
+        :param max_entries: 内存中保留的最大条目数。
+        :param persist_path: 可选，持久化文件路径；为 None 时只缓存在内存中。
+        """
+        self.max_entries = max(1, max_entries)
+        self.persist_path = str(persist_path) if persist_path else None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._flights = SingleFlight()
+        self._save_task: Optional[asyncio.Task] = None
+        # 保证同一时刻只有一次保存在写文件
+        self._save_lock = asyncio.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(api_format: str, model: str, system_prompt: str, text: str) -> str:
+        """根据请求格式、模型、系统提示词和文本计算缓存键"""
+        material = json.dumps([api_format, model, system_prompt, text], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, value in data.items():
+                self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            logger.info(f"翻译缓存已加载 {len(self._entries)} 个条目。")
+        except (json.JSONDecodeError, IOError, AttributeError) as e:
+            logger.warning(f"加载翻译缓存失败，将使用空缓存: {e}")
+            self._entries.clear()
+
+    def _write_snapshot(self, snapshot: Dict[str, str]):
+        directory, name = os.path.split(os.path.abspath(self.persist_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{name}.", suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.persist_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    async def flush(self):
+        """立即将缓存写入磁盘，取代尚未开始的延迟保存；前一次保存仍在写入时等待其完成"""
+        if not self.persist_path:
+            return
+        task = self._save_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._save_task = None
+        async with self._save_lock:
+            try:
+                # 在锁内取快照，后完成的保存总是写入较新的数据
+                await asyncio.to_thread(self._write_snapshot, dict(self._entries))
+            except (IOError, OSError) as e:
+                logger.warning(f"保存翻译缓存失败: {e}")
+
+    async def _delayed_save(self):
+        await asyncio.sleep(self.SAVE_DELAY_SECONDS)
+        self._save_task = None
+        await self.flush()
+
+    def _schedule_save(self):
+        """合并短时间内的多次写入，延迟保存"""
+        if self.persist_path and self._save_task is None:
+            self._save_task = asyncio.create_task(self._delayed_save())
+
+    def get(self, key: str) -> Optional[str]:
+        """直接查询缓存，不触发请求"""
+        cached = self._entries.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return cached
+
+    def put(self, key: str, value: str):
+        """写入一条缓存"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._schedule_save()
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        返回缓存结果；未命中时调用 fetch 获取。并发的相同请求共享同一次 fetch。
+        fetch 返回 None（失败）时不写入缓存。
+        """
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        async def fetch_and_store() -> Optional[str]:
+            result = await fetch()
+            if result is not None:
+                self.put(key, result)
+            return result
+
+        result, shared = await self._flights.run(key, fetch_and_store)
+        if shared:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return result
+
+    def stats(self) -> Dict:
+        """返回缓存的命中统计信息"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -1,211 +1,988 @@
 import asyncio
+import functools
 import os
-import re
-import uuid
-import wave
-from typing import Optional, List, Dict
+import time
+from typing import AsyncIterator, Optional, List, Dict, Tuple
 
 import httpx
 from astrbot.api import logger, AstrBotConfig
 
+from .admission import PRIORITY_NORMAL, SynthesisAdmission
+from .audio_cache import AudioCache
+from .audio_encoder import OUTPUT_FORMATS, AudioEncoder
+from .audio_io import AudioIOExecutor
+from .audio_join import ChunkJoiner
+from .deadline import Deadline
+from .hedging import HedgePolicy
+from .metrics import Metrics
+from .pcm_buffer import MemoryBudget, PcmChunk, write_wav
+from .reference_state import ReferenceAudioTracker
+from .server_scheduler import ServerScheduler
+from .single_flight import SingleFlight
+from .temp_store import TempAudioStore
+from .text_splitter import DEFAULT_SENTENCE_SPLIT_REGEX, StreamingSentenceSplitter, balance_chunks, split_sentences
+
 # --- 音频参数 (必须与Genie TTS服务输出匹配) ---
 BYTES_PER_SAMPLE = 2
 CHANNELS = 1
 SAMPLE_RATE = 32000
 
+# 本插件独占的临时音频目录，启动时会清空其中遗留的文件
+TEMP_AUDIO_DIR = os.path.join("data", "temp_audio", "tts_llm")
+
+
+class _PipelineState:
+    """一次分块合成流水线的共享状态：按块序号记录结果，并在状态变化时唤醒等待者"""
+
+    def __init__(self):
+        self.chunks: Dict[int, Optional[PcmChunk]] = {}
+        self.produced = 0
+        self.total: Optional[int] = None
+        self.failed = False
+        self._changed = asyncio.Event()
+
+    def __setitem__(self, index: int, chunk: Optional[PcmChunk]):
+        self.chunks[index] = chunk
+        self.notify()
+
+    def notify(self):
+        self._changed.set()
+
+    def is_ready(self, start: int, end: int) -> bool:
+        return all(i in self.chunks for i in range(start, end))
+
+    async def wait_until(self, predicate):
+        while not predicate():
+            self._changed.clear()
+            await self._changed.wait()
+
 
 class TTSEngine:
-    """处理所有与TTS合成相关的核心逻辑，包括文本分块、并发合成和音频合并"""
+    """
+    处理所有与TTS合成相关的核心逻辑，包括文本分块、并发合成和音频合并。
+    分块音频以PCM形式保存在内存中（受内存额度限制，超出时转存磁盘），最终一次写成WAV文件。
+    """
 
-    def __init__(self, config: AstrBotConfig, http_client: httpx.AsyncClient):
+    def __init__(
+        self, config: AstrBotConfig, http_client: httpx.AsyncClient, audio_cache: Optional[AudioCache] = None,
+        audio_io: Optional[AudioIOExecutor] = None,
+    ):
         self.config = config
         self.http_client = http_client
-        self.tts_server_index = 0
+        self.audio_cache = audio_cache
+        self._owns_audio_io = audio_io is None
+        self.audio_io = audio_io or AudioIOExecutor(self.config.get("audio_io_workers", 2))
+        self.reference_tracker = ReferenceAudioTracker()
+        self.scheduler = ServerScheduler(
+            http_client,
+            failure_threshold=self.config.get("circuit_failure_threshold", 3),
+            open_seconds=self.config.get("circuit_open_seconds", 30),
+            on_circuit_open=self.reference_tracker.invalidate_server,
+            default_capacity=self.config.get("server_max_concurrency", 1),
+            capacity_overrides=self._parse_concurrency_overrides(self.config.get("server_concurrency_overrides", [])),
+        )
+        self.admission = SynthesisAdmission(
+            capacity_fn=lambda: self.scheduler.total_capacity(self.config.get("tts_servers", [])),
+            max_queue=self.config.get("admission_max_queue", 64),
+            max_wait_seconds=self.config.get("admission_max_wait_seconds", 60),
+        )
+        self.encoder: Optional[AudioEncoder] = None
+        output_format = self.config.get("output_audio_format", "wav")
+        if output_format in OUTPUT_FORMATS:
+            self.encoder = AudioEncoder(
+                output_format,
+                bitrate_kbps=self.config.get("output_audio_bitrate_kbps", 32),
+                max_workers=self.config.get("audio_encode_workers", 2),
+                io_executor=self.audio_io,
+            )
+        elif output_format != "wav":
+            logger.warning(f"不支持的输出音频格式: {output_format}，将使用WAV。")
+        self.joiner: Optional[ChunkJoiner] = None
+        if self.config.get("enable_seamless_join", True):
+            if ChunkJoiner.available():
+                self.joiner = ChunkJoiner(
+                    SAMPLE_RATE, CHANNELS, BYTES_PER_SAMPLE,
+                    silence_threshold_db=self.config.get("join_silence_threshold_db", -40),
+                    pause_ms=self.config.get("join_pause_ms", 120),
+                    crossfade_ms=self.config.get("join_crossfade_ms", 10),
+                )
+            else:
+                logger.warning("未安装 numpy，分块音频将直接拼接，不做静音裁剪和淡入淡出。")
+        self.temp_store = TempAudioStore(
+            TEMP_AUDIO_DIR,
+            ttl_seconds=self.config.get("temp_audio_ttl_minutes", 10) * 60,
+            max_bytes=int(self.config.get("temp_audio_max_mb", 512) * 1024 * 1024),
+            io_executor=self.audio_io,
+            is_protected=self.audio_cache.owns if self.audio_cache else None,
+        )
+        self.memory_budget = MemoryBudget(int(self.config.get("audio_memory_limit_mb", 64) * 1024 * 1024))
+        self.hedge_policy = HedgePolicy(
+            percentile=self.config.get("hedge_percentile", 95),
+            min_delay=self.config.get("hedge_min_delay", 1.0),
+            max_extra_inflight=self.config.get("hedge_max_extra_inflight", 2),
+        )
+        self.metrics = Metrics(window=int(self.config.get("metrics_window", 512)))
+        # 合并不同会话中同时进行的相同合成任务（整段回复、单个分块和编码）
+        self.flights: Optional[SingleFlight] = SingleFlight() if self.config.get("enable_single_flight", True) else None
+
+    @staticmethod
+    def _parse_concurrency_overrides(entries: List[str]) -> Dict[str, int]:
+        """解析形如 "https://server|4" 的单服务器并发配置"""
+        overrides = {}
+        for entry in entries or []:
+            url, sep, value = str(entry).rpartition("|")
+            if not sep or not url.strip():
+                logger.warning(f"忽略无效的服务器并发配置: {entry}")
+                continue
+            try:
+                overrides[url.strip()] = int(value)
+            except ValueError:
+                logger.warning(f"忽略无效的服务器并发配置: {entry}")
+        return overrides
+
+    async def warm_up(
+        self, references: List[Tuple[str, str, str]], synthesis_text: Optional[str] = None,
+    ):
+        """
+        预热所有TTS服务器：按并发数建立连接池中的连接，并在每台服务器上预先设置参考音频。
+        :param references: (角色名, 参考音频路径, 参考音频文本) 列表；每个角色在服务器上只保留一个参考音频，因此每个角色只需提供一个。
+        :param synthesis_text: 可选，设置参考音频后再合成这段文本，使服务器完成模型的首次推理。
+        """
+        servers = self.scheduler.unique_servers(self.config.get("tts_servers", []))
+
+        async def open_connection(server_url: str) -> httpx.Response:
+            # 预热请求同样占用服务器的并发名额，不会使服务器超出并发限制
+            await self.scheduler.acquire(server_url)
+            try:
+                return await self.http_client.get(server_url, timeout=30)
+            finally:
+                self.scheduler.release(server_url)
+
+        async def warm_server(server_url: str):
+            start_time = time.monotonic()
+            capacity = self.scheduler.total_capacity([server_url])
+            # 并发请求以建立与并发数相同的连接，之后的请求可直接复用
+            responses = await asyncio.gather(
+                *(open_connection(server_url) for _ in range(capacity)), return_exceptions=True
+            )
+            if all(isinstance(r, Exception) for r in responses):
+                logger.warning(f"预热TTS服务器 {server_url} 失败: {responses[0]}")
+                return
+
+            for character_name, ref_audio_path, ref_audio_text in references:
+                if synthesis_text:
+                    # 经由调度器合成，结果计入服务器的耗时统计和熔断状态
+                    chunk = await self._attempt_synthesis_on_server(
+                        server_url, character_name, ref_audio_path, ref_audio_text, synthesis_text, "warmup", Deadline()
+                    )
+                    if chunk:
+                        chunk.discard()
+                    continue
+                try:
+                    await self.reference_tracker.acquire(
+                        server_url, character_name, (ref_audio_path, ref_audio_text),
+                        functools.partial(self._set_reference, server_url, character_name, ref_audio_path, ref_audio_text),
+                    )
+                except Exception as e:
+                    logger.warning(f"预热TTS服务器 {server_url} 时设置参考音频失败: {e}")
+                    continue
+                await self.reference_tracker.release(server_url, character_name)
+            logger.info(f"TTS服务器 {server_url} 预热完成，耗时 {time.monotonic() - start_time:.1f} 秒。")
+
+        await asyncio.gather(*(warm_server(url) for url in servers), return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """汇总各阶段耗时、服务器计数以及各组件的统计信息"""
+        snapshot = self.metrics.snapshot()
+        snapshot["scheduler"] = self.scheduler.snapshot()
+        snapshot["admission"] = self.admission.stats()
+        snapshot["hedging"] = self.hedge_policy.stats()
+        snapshot["memory"] = self.memory_budget.stats()
+        snapshot["audio_io"] = self.audio_io.stats()
+        snapshot["temp_audio"] = self.temp_store.stats()
+        if self.audio_cache:
+            snapshot["audio_cache"] = self.audio_cache.stats()
+        if self.encoder:
+            snapshot["encoder"] = self.encoder.stats()
+        if self.flights:
+            snapshot["single_flight"] = self.flights.stats()
+        return snapshot
+
+    async def close(self):
+        """停止后台任务"""
+        await self.scheduler.close()
+        await self.temp_store.close()
+        if self._owns_audio_io:
+            self.audio_io.shutdown()
+
+    def _cache_key(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str, whole_reply: bool,
+    ) -> str:
+        """计算音频缓存键。整段回复的结果还取决于切分配置，因此将其一并纳入。"""
+        audio_params = {
+            "sample_rate": SAMPLE_RATE, "channels": CHANNELS, "bytes_per_sample": BYTES_PER_SAMPLE,
+            "split_sentence": True,
+        }
+        if whole_reply and self.config.get("enable_sentence_splitting", False):
+            audio_params["chunk_strategy"] = self.config.get("chunk_strategy", "fixed")
+            audio_params["sentences_per_chunk"] = self.config.get("sentences_per_chunk", 2)
+            audio_params["min_chunk_chars"] = self.config.get("min_chunk_chars", 10)
+            audio_params["max_chunk_chars"] = self.config.get("max_chunk_chars", 100)
+            audio_params["sentence_split_regex"] = self.config.get("sentence_split_regex", DEFAULT_SENTENCE_SPLIT_REGEX)
+            if self.joiner:
+                audio_params["join"] = [
+                    self.config.get("join_silence_threshold_db", -40),
+                    self.config.get("join_pause_ms", 120),
+                    self.config.get("join_crossfade_ms", 10),
+                ]
+        return AudioCache.make_key(character_name, ref_audio_path, ref_audio_text, text, audio_params)
+
+    def _balanced_chunking(self) -> bool:
+        return self.config.get("chunk_strategy", "fixed") == "balanced"
+
+    def _split_text_into_chunks(self, text: str) -> list[str]:
+        """
+        根据标点将文本切分为句子，再合并成块。
+        均衡模式下按字数均衡各块的合成开销，块数取决于当前可用的服务器并发名额，
+        开启渐进式发送时至少比第一段的块数多一块，使单台服务器时也能提前发送；
+        固定模式下每块包含 sentences_per_chunk 个句子。
+        """
+        regex_pattern = self.config.get("sentence_split_regex", DEFAULT_SENTENCE_SPLIT_REGEX)
+        full_sentences = split_sentences(text, regex_pattern)
+
+        if self._balanced_chunking():
+            slots = self.scheduler.available_capacity(self.config.get("tts_servers", []))
+            if self.config.get("enable_progressive_delivery", False):
+                slots = max(slots, self.config.get("progressive_first_chunks", 1) + 1)
+            chunks = balance_chunks(
+                full_sentences, slots,
+                min_chars=self.config.get("min_chunk_chars", 10),
+                max_chars=self.config.get("max_chunk_chars", 100),
+            )
+        else:
+            sentences_per_chunk = self.config.get("sentences_per_chunk", 2)
+            if sentences_per_chunk <= 0:
+                return [text]
+            chunks = []
+            for i in range(0, len(full_sentences), sentences_per_chunk):
+                chunk = "".join(full_sentences[i:i + sentences_per_chunk])
+                chunks.append(chunk)
 
-    def _split_text_into_chunks(self, text: str, sentences_per_chunk: int) -> list[str]:
-        """根据标点将文本切分为句子，再按指定数量合并成块"""
-        if sentences_per_chunk <= 0:
-            return [text]
-            
-        regex_pattern = self.config.get("sentence_split_regex", r'([。、，！？,.!?])')
-        
-        sentences = re.split(regex_pattern, text)
-        if not sentences:
-            return []
-
-        full_sentences = []
-        for i in range(0, len(sentences) - 1, 2):
-            sentence = sentences[i]
-            delimiter = sentences[i+1] if i+1 < len(sentences) else ""
-            if sentence:
-                full_sentences.append(sentence + delimiter)
-        if len(sentences) % 2 == 1 and sentences[-1]:
-            full_sentences.append(sentences[-1])
-
-        chunks = []
-        for i in range(0, len(full_sentences), sentences_per_chunk):
-            chunk = "".join(full_sentences[i:i + sentences_per_chunk])
-            chunks.append(chunk)
-            
         logger.info(f"文本已切分为 {len(chunks)} 个块。")
         return chunks
 
-    async def _merge_wav_files(self, input_paths: list[str]) -> Optional[str]:
-        """以无损的方式将多个WAV文件按顺序合并为一个，并清理分块文件。"""
-        if not input_paths:
-            return None
-        
-        output_dir = os.path.join("data", "temp_audio")
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, f"{uuid.uuid4()}_merged.wav")
+    def _new_chunk(self) -> PcmChunk:
+        return PcmChunk(self.memory_budget, self.temp_store.directory, self.audio_io, BYTES_PER_SAMPLE * CHANNELS)
 
+    @staticmethod
+    def _write_chunk_wav(chunk: PcmChunk, path: str):
+        write_wav(path, [chunk], CHANNELS, BYTES_PER_SAMPLE, SAMPLE_RATE)
+
+    def _write_segment_file(self, path: str, chunks: List[PcmChunk]):
+        """在音频线程池中执行：创建目录并拼接写入WAV文件，失败时删除写了一半的文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         try:
-            with wave.open(input_paths[0], 'rb') as wf_in:
-                params = wf_in.getparams()
+            write_wav(path, chunks, CHANNELS, BYTES_PER_SAMPLE, SAMPLE_RATE, self.joiner)
+        except Exception:
+            self._remove_file(path)
+            raise
 
-            with wave.open(output_path, 'wb') as wf_out:
-                wf_out.setparams(params)
-                for file_path in input_paths:
-                    with wave.open(file_path, 'rb') as wf_in:
-                        wf_out.writeframes(wf_in.readframes(wf_in.getnframes()))
-            
-            logger.info(f"成功将 {len(input_paths)} 个音频文件合并到: {output_path}")
-            
-            for file_path in input_paths:
-                try:
-                    os.remove(file_path)
-                except OSError as e:
-                    logger.warning(f"删除临时文件 {file_path} 失败: {e}")
-                    
+    async def _write_segment(self, chunks: List[PcmChunk], session_id_for_log: str) -> Optional[str]:
+        """将若干分块按顺序一次写成一个WAV文件（在线程中执行），并释放分块占用的内存和临时文件"""
+        if not chunks:
+            return None
+        if len(chunks) == 1 and chunks[0].wav_path:
+            # 唯一的分块直接来自缓存文件，无需复制
+            return chunks[0].wav_path
+
+        output_path = self.temp_store.new_path(".wav")
+        try:
+            with self.metrics.span("merge"):
+                await self.audio_io.run(self._write_segment_file, output_path, chunks)
+            await self.temp_store.track(output_path)
+            if len(chunks) > 1:
+                logger.info(f"[{session_id_for_log}] 成功将 {len(chunks)} 个音频分块合并到: {output_path}")
             return output_path
+        except asyncio.CancelledError:
+            self._remove_file(output_path)
+            raise
         except Exception as e:
-            logger.error(f"合并WAV文件时出错: {e}")
+            logger.error(f"[{session_id_for_log}] 写入WAV文件时出错: {e}")
             return None
+        finally:
+            for chunk in chunks:
+                chunk.discard()
 
     async def _attempt_synthesis_on_server(
         self, server_url: str, character_name: str, ref_audio_path: str,
-        ref_audio_text: str, text: str, session_id_for_log: str,
-    ) -> Optional[str]:
-        """使用单个指定的TTS服务器尝试合成语音，并返回保存好的文件路径。"""
-        logger.info(f"[{session_id_for_log}] 尝试TTS服务器: {server_url}")
+        ref_audio_text: str, text: str, session_id_for_log: str, deadline: Deadline,
+    ) -> Optional[PcmChunk]:
+        """
+        使用单个指定的TTS服务器尝试合成语音，并返回音频分块。结果会计入调度器的健康统计；
+        因回复截止时间到达而放弃的请求不计为服务器失败。
+        """
         try:
-            ref_payload = {
-                "character_name": character_name, "audio_path": ref_audio_path, "audio_text": ref_audio_text,
-            }
-            response = await self.http_client.post(f"{server_url}/set_reference_audio", json=ref_payload, timeout=60)
+            await deadline.run(self.scheduler.acquire(server_url))
+        except asyncio.TimeoutError:
+            return None
+        start_time = time.monotonic()
+        try:
+            chunk = await deadline.run(self._request_synthesis(
+                server_url, character_name, ref_audio_path, ref_audio_text, text, session_id_for_log, deadline
+            ))
+        except asyncio.TimeoutError:
+            logger.warning(f"[{session_id_for_log}] 已到达回复截止时间，放弃TTS服务器 {server_url} 上的请求。")
+            self.metrics.record_request(server_url, time.monotonic() - start_time, timed_out=True)
+            return None
+        finally:
+            self.scheduler.release(server_url)
+
+        latency = time.monotonic() - start_time
+        if chunk:
+            self.scheduler.record_success(server_url, latency, len(text))
+            self.hedge_policy.record(latency)
+            self.metrics.record_request(server_url, latency, len(text), chunk.nbytes)
+        else:
+            self.scheduler.record_failure(server_url)
+            self.metrics.record_request(server_url, latency, failed=True)
+        return chunk
+
+    async def _set_reference(
+        self, server_url: str, character_name: str, ref_audio_path: str, ref_audio_text: str, timeout: float = 60,
+    ):
+        ref_payload = {"character_name": character_name, "audio_path": ref_audio_path, "audio_text": ref_audio_text}
+        with self.metrics.span("set_reference"):
+            response = await self.http_client.post(
+                f"{server_url}/set_reference_audio", json=ref_payload, timeout=timeout
+            )
             response.raise_for_status()
 
+    async def _request_synthesis(
+        self, server_url: str, character_name: str, ref_audio_path: str,
+        ref_audio_text: str, text: str, session_id_for_log: str, deadline: Optional[Deadline] = None,
+    ) -> Optional[PcmChunk]:
+        """向服务器发送设置参考音频和合成请求，并将返回的PCM音频流收集到分块中"""
+        logger.info(f"[{session_id_for_log}] 尝试TTS服务器: {server_url}")
+        deadline = deadline or Deadline()
+        try:
+            switched = await self.reference_tracker.acquire(
+                server_url, character_name, (ref_audio_path, ref_audio_text),
+                functools.partial(
+                    self._set_reference, server_url, character_name, ref_audio_path, ref_audio_text,
+                    deadline.timeout(60),
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"[{session_id_for_log}] TTS服务器 {server_url} 设置参考音频失败: {e}")
+            return None
+        if not switched:
+            logger.debug(f"[{session_id_for_log}] 服务器 {server_url} 已加载该参考音频，跳过设置。")
+
+        success = False
+        chunk = self._new_chunk()
+        start_time = time.monotonic()
+        try:
             tts_payload = {"character_name": character_name, "text": text, "split_sentence": True}
-            async with self.http_client.stream("POST", f"{server_url}/tts", json=tts_payload, timeout=300) as response_tts:
-                response_tts.raise_for_status()
-                output_dir = os.path.join("data", "temp_audio")
-                os.makedirs(output_dir, exist_ok=True)
-                output_path = os.path.join(output_dir, f"{uuid.uuid4()}.wav")
-                with wave.open(output_path, "wb") as wf:
-                    wf.setnchannels(CHANNELS)
-                    wf.setsampwidth(BYTES_PER_SAMPLE)
-                    wf.setframerate(SAMPLE_RATE)
-                    async for chunk in response_tts.aiter_bytes():
-                        wf.writeframes(chunk)
-                return output_path
+            with self.metrics.span("tts"):
+                async with self.http_client.stream(
+                    "POST", f"{server_url}/tts", json=tts_payload, timeout=deadline.timeout(300)
+                ) as response_tts:
+                    response_tts.raise_for_status()
+                    first_byte = True
+                    async for data in response_tts.aiter_bytes():
+                        if first_byte:
+                            self.metrics.observe("tts_first_byte", time.monotonic() - start_time)
+                            first_byte = False
+                        await chunk.append(data)
+                    await chunk.finish()
+                success = True
+                return chunk
         except Exception as e:
             logger.warning(f"[{session_id_for_log}] TTS服务器 {server_url} 交互失败: {e}")
             return None
+        finally:
+            if not success:
+                # 失败或被取消（例如对冲中落败）时释放收到一半的数据
+                chunk.discard()
+            # 失败时服务器状态未知（可能已重启），清除记录以便下次重新设置参考音频
+            await self.reference_tracker.release(server_url, character_name, invalidate=not success)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除临时文件 {path} 失败: {e}")
+
+    async def _attempt_with_hedge(
+        self, server_url: str, candidates: List[str], tried: set, character_name: str,
+        ref_audio_path: str, ref_audio_text: str, text: str, session_id_for_log: str, deadline: Deadline,
+    ) -> Optional[PcmChunk]:
+        """
+        在指定服务器上合成；若超过对冲延迟仍未完成，则向另一台空闲服务器发送相同请求，
+        采用先成功的结果并取消另一个。
+        """
+        attempt_args = (character_name, ref_audio_path, ref_audio_text, text)
+        primary = asyncio.create_task(
+            self._attempt_synthesis_on_server(server_url, *attempt_args, session_id_for_log, deadline)
+        )
+        delay = self.hedge_policy.delay() if self.config.get("enable_request_hedging", False) else None
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        backup_url = next(
+            (url for url in candidates if url not in tried and self.scheduler.is_idle(url)), None
+        )
+        if not backup_url or not self.hedge_policy.try_acquire():
+            return await primary
+
+        tried.add(backup_url)
+        logger.info(f"[{session_id_for_log}] 服务器 {server_url} 超过 {delay:.1f} 秒未完成，向 {backup_url} 发送对冲请求。")
+        backup = asyncio.create_task(
+            self._attempt_synthesis_on_server(backup_url, *attempt_args, f"{session_id_for_log}-hedge", deadline)
+        )
+        pending = {primary, backup}
+        winner = None
+        try:
+            while pending and not winner:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    chunk = task.result()
+                    if not chunk:
+                        continue
+                    if winner:
+                        # 两个请求同时成功，丢弃多余的结果
+                        chunk.discard()
+                    else:
+                        winner = (task, chunk)
+            return winner[1] if winner else None
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            self.hedge_policy.release(won=bool(winner) and winner[0] is backup)
+
+    async def _synthesize_chunk(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str, session_id_for_log: str,
+        deadline: Deadline,
+    ) -> Optional[PcmChunk]:
+        """按调度器给出的顺序依次尝试服务器合成一个分块，必要时发送对冲请求；截止时间到达后不再故障转移"""
+        candidates = self.scheduler.candidates(self.config.get("tts_servers", []), len(text))
+        tried = set()
+        for server_url in candidates:
+            if deadline.expired():
+                break
+            if server_url in tried:
+                continue
+            if tried:
+                self.metrics.server(server_url).retries += 1
+            tried.add(server_url)
+            chunk = await self._attempt_with_hedge(
+                server_url, candidates, tried, character_name, ref_audio_path, ref_audio_text, text,
+                session_id_for_log, deadline,
+            )
+            if chunk:
+                return chunk
+        return None
         
     async def _synthesis_worker(
-        self, worker_id: int, task_queue: asyncio.Queue, results_list: list,
+        self, worker_id: int, task_queue: asyncio.Queue, results_list,
         character_name: str, ref_audio_path: str, ref_audio_text: str, session_id_for_log: str,
+        priority: int, deadline: Deadline,
     ):
-        """单个TTS服务器的工作进程，从队列中获取任务并处理"""
-        servers = self.config.get("tts_servers", [])
-        num_servers = len(servers)
-        
-        while not task_queue.empty():
+        """单个TTS服务器的工作进程，从队列中获取任务并处理，直到被取消。每个分块合成前需获得全局准入名额。"""
+        while True:
             try:
                 task_index, chunk_text = await task_queue.get()
             except asyncio.CancelledError:
                 break
-            
-            start_server_idx = worker_id % num_servers
-            audio_path = None
-            for i in range(num_servers):
-                server_idx = (start_server_idx + i) % num_servers
-                server_url = servers[server_idx].strip("/")
-                log_id = f"{session_id_for_log}-chunk-{task_index+1}"
-                
-                audio_path = await self._attempt_synthesis_on_server(
-                    server_url, character_name, ref_audio_path, ref_audio_text, chunk_text, log_id
+
+            try:
+                results_list[task_index] = await self._process_chunk_task(
+                    worker_id, task_index, chunk_text, character_name, ref_audio_path, ref_audio_text,
+                    session_id_for_log, priority, deadline,
                 )
-                if audio_path:
-                    logger.info(f"[Worker-{worker_id}] 成功合成块 {task_index+1} 于服务器 {server_url}")
-                    results_list[task_index] = audio_path
-                    break
-            
-            if not audio_path:
-                logger.error(f"[Worker-{worker_id}] 块 {task_index+1} 尝试所有服务器后仍然失败。")
+            except Exception as e:
+                # 记为失败并继续处理下一块；否则该块永远没有结果，流水线会一直等待
+                logger.error(f"[Worker-{worker_id}] 处理块 {task_index+1} 时出错: {e}")
                 results_list[task_index] = None
+            finally:
+                task_queue.task_done()
+
+    async def _process_chunk_task(
+        self, worker_id: int, task_index: int, chunk_text: str,
+        character_name: str, ref_audio_path: str, ref_audio_text: str, session_id_for_log: str,
+        priority: int, deadline: Deadline,
+    ) -> Optional[PcmChunk]:
+        """处理队列中的一个分块：先查缓存，再合成（与其他会话中相同的任务合并）；失败时返回 None"""
+        chunk_key = self._cache_key(character_name, ref_audio_path, ref_audio_text, chunk_text, whole_reply=False)
+        use_cache = self.audio_cache and self.config.get("audio_cache_per_chunk", True)
+        if use_cache:
+            cached_path = await self.audio_cache.get(chunk_key)
+            if cached_path:
+                logger.info(f"[Worker-{worker_id}] 块 {task_index+1} 命中音频缓存。")
+                return PcmChunk.from_wav(cached_path)
+
+        produce = functools.partial(
+            self._synthesize_and_cache_chunk, character_name, ref_audio_path, ref_audio_text, chunk_text,
+            f"{session_id_for_log}-chunk-{task_index+1}", session_id_for_log, priority, deadline,
+            chunk_key if use_cache else None,
+        )
+        if self.flights:
+            chunk, shared = await self.flights.run(
+                ("chunk", chunk_key), produce, share=PcmChunk.share, release=PcmChunk.discard
+            )
+            if shared:
+                logger.info(f"[Worker-{worker_id}] 块 {task_index+1} 与其他会话中相同的合成任务合并。")
+                if not chunk and not deadline.expired():
+                    # 对方失败或因其截止时间放弃，按本会话的截止时间自行重试
+                    chunk = await produce()
+        else:
+            chunk = await produce()
+        if chunk:
+            logger.info(f"[Worker-{worker_id}] 成功合成块 {task_index+1}")
+        else:
+            logger.error(f"[Worker-{worker_id}] 块 {task_index+1} 尝试所有服务器后仍然失败。")
+        return chunk
+
+    async def _synthesize_and_cache_chunk(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str, log_id: str,
+        session_id_for_log: str, priority: int, deadline: Deadline, cache_key: Optional[str],
+    ) -> Optional[PcmChunk]:
+        """获得准入名额后合成一个分块；提供 cache_key 时先写入缓存再返回"""
+        wait_start = time.monotonic()
+        async with self.admission.permit(session_id_for_log, priority):
+            self.metrics.observe("admission_wait", time.monotonic() - wait_start)
+            chunk = await self._synthesize_chunk(
+                character_name, ref_audio_path, ref_audio_text, text, log_id, deadline
+            )
+        if chunk and cache_key:
+            # 先写入缓存再交付，交付后分块可能随时被合并并释放
+            try:
+                await self.audio_cache.put_with(cache_key, lambda path: self._write_chunk_wav(chunk, path))
+            except asyncio.CancelledError:
+                chunk.discard()
+                raise
+        return chunk
+
+    def _spawn_workers(
+        self, task_queue: asyncio.Queue, state: "_PipelineState",
+        character_name: str, ref_audio_path: str, ref_audio_text: str, session_id_for_log: str,
+        max_workers: Optional[int], priority: int, deadline: Deadline,
+    ) -> List[asyncio.Task]:
+        """按所有服务器的并发名额总数创建worker，共同消费任务队列；max_workers 为已知的分块数上限"""
+        worker_count = self.scheduler.total_capacity(self.config.get("tts_servers", []))
+        if max_workers is not None:
+            worker_count = min(worker_count, max_workers)
+        return [
+            asyncio.create_task(
+                self._synthesis_worker(
+                    worker_id=i, task_queue=task_queue, results_list=state,
+                    character_name=character_name, ref_audio_path=ref_audio_path,
+                    ref_audio_text=ref_audio_text, session_id_for_log=session_id_for_log,
+                    priority=priority, deadline=deadline,
+                )
+            ) for i in range(max(1, worker_count))
+        ]
+
+    @staticmethod
+    async def _stop_workers(workers: List[asyncio.Task]):
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _assemble_results(
+        self, state: "_PipelineState", indices: range, session_id_for_log: str,
+    ) -> Optional[str]:
+        """按块顺序收集指定范围内的合成结果并写成一个WAV文件"""
+        successful_chunks = [state.chunks[i] for i in indices if state.chunks.get(i)]
+        if not successful_chunks:
+            logger.error(f"[{session_id_for_log}] 块 {indices.start+1}-{indices.stop} 全部合成失败。")
+            return None
+
+        return await self._write_segment(successful_chunks, session_id_for_log)
+
+    @staticmethod
+    def _ready_prefix_end(state: "_PipelineState", start: int) -> int:
+        """从 start 起连续已完成（成功或失败）的最后一个分块之后的下标"""
+        end = start
+        while end in state.chunks:
+            end += 1
+        return end
+
+    @staticmethod
+    def _discard_results(state: "_PipelineState", from_index: int):
+        """释放尚未交付的分块"""
+        for index, chunk in state.chunks.items():
+            if index >= from_index and chunk:
+                chunk.discard()
+
+    @staticmethod
+    async def _produce_chunks(
+        chunk_source: AsyncIterator[str], task_queue: asyncio.Queue, state: "_PipelineState", session_id_for_log: str,
+    ):
+        """将文本块依次放入任务队列；文本源抛出异常时将流水线标记为失败"""
+        try:
+            async for chunk in chunk_source:
+                task_queue.put_nowait((state.produced, chunk))
+                state.produced += 1
+                state.notify()
+        except Exception as e:
+            logger.error(f"[{session_id_for_log}] 流式文本中断，放弃本次合成: {e}")
+            state.failed = True
+        else:
+            state.total = state.produced
+            logger.info(f"[{session_id_for_log}] 文本接收完毕，共 {state.total} 个语音块。")
+        state.notify()
+
+    async def _iter_pipeline_segments(
+        self, chunk_source: AsyncIterator[str], character_name: str, ref_audio_path: str, ref_audio_text: str,
+        session_id_for_log: str, first_segment_chunks: int = 0, max_workers: Optional[int] = None,
+        priority: int = PRIORITY_NORMAL, deadline: Optional[Deadline] = None,
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        """
+        分块合成流水线。worker并发合成各块，本生成器按块顺序产出 (音频路径, 是否为最后一段)。
+        first_segment_chunks > 0 时，前 N 个块就绪后立即作为第一段产出，其余块全部完成后合并为第二段；
+        为 0 时所有块完成后合并为一段。
+        截止时间到达时停止等待，将已按顺序连续完成的分块合并为最后一段产出，其余分块放弃。
+        """
+        deadline = deadline or Deadline()
+        state = _PipelineState()
+        task_queue = asyncio.Queue()
+        workers = self._spawn_workers(
+            task_queue, state, character_name, ref_audio_path, ref_audio_text, session_id_for_log,
+            max_workers, priority, deadline,
+        )
+        producer = asyncio.create_task(self._produce_chunks(chunk_source, task_queue, state, session_id_for_log))
+        logger.info(f"[{session_id_for_log}] 创建了 {len(workers)} 个worker来处理语音块...")
+
+        start = 0
+        try:
+            while True:
+                try:
+                    if start == 0 and first_segment_chunks > 0:
+                        target = first_segment_chunks
+                        await deadline.run(state.wait_until(lambda: state.failed or (
+                            state.total is not None and state.total <= target and state.is_ready(0, state.total)
+                        ) or (state.produced > target and state.is_ready(0, target))))
+                        end = state.total if state.total is not None and state.total <= target else target
+                    else:
+                        await deadline.run(state.wait_until(lambda: state.failed or (
+                            state.total is not None and state.is_ready(start, state.total)
+                        )))
+                        end = state.total
+                except asyncio.TimeoutError:
+                    end = self._ready_prefix_end(state, start)
+                    logger.warning(
+                        f"[{session_id_for_log}] 已到达回复截止时间，仅发送已完成的 {end} 个语音块。"
+                    )
+                    path = await self._assemble_results(state, range(start, end), session_id_for_log)
+                    start = end
+                    if path:
+                        yield path, True
+                    return
+                if state.failed:
+                    return
+
+                is_last = end >= state.total if state.total is not None else False
+                path = await self._assemble_results(state, range(start, end), session_id_for_log)
+                start = end
+                if path:
+                    yield path, is_last
+                if is_last:
+                    return
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            await self._stop_workers(workers)
+            self._discard_results(state, start)
+
+    async def _iter_stream_chunks(self, text_stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """将流式文本增量切分为文本块"""
+        regex_pattern = self.config.get("sentence_split_regex", DEFAULT_SENTENCE_SPLIT_REGEX)
+        if self._balanced_chunking():
+            # 全文长度未知，无法整体均衡，只按字数上下限合并句子
+            splitter = StreamingSentenceSplitter(
+                regex_pattern, 1,
+                min_chars=self.config.get("min_chunk_chars", 10),
+                max_chars=self.config.get("max_chunk_chars", 100),
+            )
+        else:
+            splitter = StreamingSentenceSplitter(regex_pattern, self.config.get("sentences_per_chunk", 2))
+        async for delta in text_stream:
+            for chunk in splitter.feed(delta):
+                yield chunk
+        for chunk in splitter.flush():
+            yield chunk
+
+    @staticmethod
+    async def _iter_list(items: List[str]) -> AsyncIterator[str]:
+        for item in items:
+            yield item
+
+    @staticmethod
+    async def _collect_single(segments: AsyncIterator[Tuple[str, bool]]) -> Optional[str]:
+        """从只产出一段的流水线中取出结果"""
+        try:
+            async for path, _ in segments:
+                return path
+            return None
+        finally:
+            await segments.aclose()
+
+    async def synthesize_stream(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str,
+        text_stream: AsyncIterator[str], session_id_for_log: str, priority: int = PRIORITY_NORMAL,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[str]:
+        """
+        流水线式合成：边接收流式翻译结果边切分句子，每凑满一个分块就立即交给worker合成，
+        使翻译与合成重叠进行。文本流抛出异常时放弃本次合成并返回 None。
+        """
+        return await self._collect_single(self.synthesize_stream_segments(
+            character_name, ref_audio_path, ref_audio_text, text_stream, session_id_for_log,
+            first_segment_chunks=0, priority=priority, deadline=deadline,
+        ))
+
+    async def synthesize_stream_segments(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str,
+        text_stream: AsyncIterator[str], session_id_for_log: str, first_segment_chunks: Optional[int] = None,
+        priority: int = PRIORITY_NORMAL, deadline: Optional[Deadline] = None,
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        """流式文本的渐进式合成，按顺序产出已就绪的 (音频路径, 是否为最后一段)"""
+        if not self.config.get("tts_servers", []):
+            logger.error(f"[{session_id_for_log}] 未配置TTS服务器。")
+            return
+        if first_segment_chunks is None:
+            first_segment_chunks = self.config.get("progressive_first_chunks", 1)
 
-            task_queue.task_done()
+        segments = self._encode_segments(self._iter_pipeline_segments(
+            self._iter_stream_chunks(text_stream), character_name, ref_audio_path, ref_audio_text,
+            session_id_for_log, first_segment_chunks, priority=priority, deadline=deadline,
+        ), session_id_for_log)
+        try:
+            async for segment in segments:
+                yield segment
+        finally:
+            await segments.aclose()
+
+    async def synthesize_segments(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str,
+        session_id_for_log: str, first_segment_chunks: Optional[int] = None, priority: int = PRIORITY_NORMAL,
+        deadline: Optional[Deadline] = None,
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        """
+        渐进式合成：按顺序产出已就绪的 (音频路径, 是否为最后一段)，使调用方可以在后续分块仍在合成时先发送开头部分。
+        未启用句子切分或文本只有一块时，等同于 synthesize 并只产出一段。
+        """
+        segments = self._encode_segments(self._iter_reply_segments(
+            character_name, ref_audio_path, ref_audio_text, text, session_id_for_log, first_segment_chunks, priority,
+            deadline or Deadline(),
+        ), session_id_for_log)
+        try:
+            async for segment in segments:
+                yield segment
+        finally:
+            await segments.aclose()
+
+    async def _iter_reply_segments(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str,
+        session_id_for_log: str, first_segment_chunks: Optional[int], priority: int, deadline: Deadline,
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        """synthesize_segments 的实现，产出未编码的WAV"""
+        text_chunks = []
+        if self.config.get("enable_sentence_splitting", False):
+            text_chunks = self._split_text_into_chunks(text)
+
+        if len(text_chunks) <= 1 or not self.config.get("tts_servers", []):
+            audio_path = await self._synthesize_wav(
+                character_name, ref_audio_path, ref_audio_text, text, session_id_for_log, priority, deadline
+            )
+            if audio_path:
+                yield audio_path, True
+            return
+
+        if self.audio_cache:
+            cache_key = self._cache_key(character_name, ref_audio_path, ref_audio_text, text, whole_reply=True)
+            cached_path = await self.audio_cache.get(cache_key)
+            if cached_path:
+                logger.info(f"[{session_id_for_log}] 命中音频缓存: {cached_path}")
+                yield cached_path, True
+                return
+
+        if first_segment_chunks is None:
+            first_segment_chunks = self.config.get("progressive_first_chunks", 1)
+        segments = self._iter_pipeline_segments(
+            self._iter_list(text_chunks), character_name, ref_audio_path, ref_audio_text,
+            session_id_for_log, first_segment_chunks, max_workers=len(text_chunks), priority=priority,
+            deadline=deadline,
+        )
+        try:
+            async for segment in segments:
+                yield segment
+        finally:
+            await segments.aclose()
+
+    async def _encode_output(self, audio_path: Optional[str], session_id_for_log: str) -> Optional[str]:
+        """按配置将WAV编码为输出格式；未启用、编码器不可用或编码失败时返回原WAV"""
+        if not audio_path or not self.encoder or not self.encoder.available:
+            return audio_path
+
+        async def encode() -> Optional[str]:
+            output_path = self.temp_store.new_path(self.encoder.suffix)
+            with self.metrics.span("encode"):
+                encoded = await self.encoder.encode(audio_path, output_path)
+            if not encoded:
+                return None
+            await self.temp_store.track(output_path)
+            return output_path
+
+        if self.flights:
+            # 多个会话共用同一个WAV（合并的任务或缓存文件）时只编码一次
+            output_path, _ = await self.flights.run(
+                ("encode", os.path.abspath(audio_path)), encode,
+                share=self.temp_store.acquire, release=self.temp_store.release,
+            )
+        else:
+            output_path = await encode()
+        if not output_path:
+            logger.warning(f"[{session_id_for_log}] 音频编码失败，发送原始WAV。")
+            return audio_path
+
+        # 编码后原WAV不再需要（仍有其他会话使用时只减少引用）；缓存中的文件受保护，不会被删除
+        await self.temp_store.discard(audio_path)
+        return output_path
+
+    async def _encode_segments(
+        self, segments: AsyncIterator[Tuple[str, bool]], session_id_for_log: str,
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        try:
+            async for audio_path, is_last in segments:
+                yield await self._encode_output(audio_path, session_id_for_log), is_last
+        finally:
+            await segments.aclose()
 
     async def synthesize(
         self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str, session_id_for_log: str,
+        priority: int = PRIORITY_NORMAL, deadline: Optional[Deadline] = None,
     ) -> Optional[str]:
-        """执行语音合成的核心入口点，支持并发处理"""
+        """
+        执行语音合成的核心入口点，优先查找音频缓存，未命中时进行（并发）合成并写入缓存。
+        启用输出编码时返回编码后的文件。
+        :param priority: 准入优先级，短回复和手动合成指令使用 PRIORITY_HIGH。
+        :param deadline: 本次回复的截止时间；到达时返回已完成的部分音频，一块都没有完成时返回 None。
+        """
+        audio_path = await self._synthesize_wav(
+            character_name, ref_audio_path, ref_audio_text, text, session_id_for_log, priority, deadline or Deadline()
+        )
+        return await self._encode_output(audio_path, session_id_for_log)
+
+    async def _synthesize_wav(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str, session_id_for_log: str,
+        priority: int, deadline: Deadline,
+    ) -> Optional[str]:
+        """
+        synthesize 的实现：查找整段缓存，未命中时合成并写入缓存，返回WAV。因截止时间只完成部分时不写入缓存。
+        其他会话正在合成相同内容时等待其结果，共用同一个文件。
+        """
+        cache_key = self._cache_key(character_name, ref_audio_path, ref_audio_text, text, whole_reply=True)
+        if self.audio_cache:
+            cached_path = await self.audio_cache.get(cache_key)
+            if cached_path:
+                logger.info(f"[{session_id_for_log}] 命中音频缓存: {cached_path}")
+                return cached_path
+
+        async def produce() -> Tuple[Optional[str], bool]:
+            """返回 (WAV路径, 是否完整)"""
+            audio_path = await self._synthesize_uncached(
+                character_name, ref_audio_path, ref_audio_text, text, session_id_for_log, priority, deadline
+            )
+            complete = not deadline.expired()
+            if audio_path and complete and self.audio_cache and not self.audio_cache.owns(audio_path):
+                await self.audio_cache.put(cache_key, audio_path)
+            return audio_path, complete
+
+        if not self.flights:
+            return (await produce())[0]
+
+        (audio_path, complete), shared = await self.flights.run(
+            ("reply", cache_key), produce,
+            share=lambda result: self.temp_store.acquire(result[0]),
+            release=lambda result: self.temp_store.release(result[0]),
+        )
+        if shared:
+            logger.info(f"[{session_id_for_log}] 与其他会话中相同的合成任务合并。")
+            if (not audio_path or not complete) and not deadline.expired():
+                # 对方失败或只完成了部分，按本会话的截止时间自行合成
+                await self.temp_store.discard(audio_path)
+                audio_path, _ = await produce()
+        return audio_path
+
+    async def _synthesize_uncached(
+        self, character_name: str, ref_audio_path: str, ref_audio_text: str, text: str, session_id_for_log: str,
+        priority: int, deadline: Deadline,
+    ) -> Optional[str]:
+        """不经过整段缓存的合成流程，支持并发处理"""
         servers = self.config.get("tts_servers", [])
         if not servers:
             logger.error(f"[{session_id_for_log}] 未配置TTS服务器。")
             return None
 
         if self.config.get("enable_sentence_splitting", False):
-            sentences_per_chunk = self.config.get("sentences_per_chunk", 2)
-            text_chunks = self._split_text_into_chunks(text, sentences_per_chunk)
+            text_chunks = self._split_text_into_chunks(text)
             
             if len(text_chunks) > 1:
-                task_queue = asyncio.Queue()
-                for i, chunk in enumerate(text_chunks):
-                    task_queue.put_nowait((i, chunk))
-
-                results_list = [None] * len(text_chunks)
-                workers = [
-                    asyncio.create_task(
-                        self._synthesis_worker(
-                            worker_id=i, task_queue=task_queue, results_list=results_list,
-                            character_name=character_name, ref_audio_path=ref_audio_path,
-                            ref_audio_text=ref_audio_text, session_id_for_log=session_id_for_log,
-                        )
-                    ) for i in range(len(servers))
-                ]
-
-                logger.info(f"[{session_id_for_log}] 创建了 {len(workers)} 个worker来处理 {len(text_chunks)} 个语音块...")
-                await task_queue.join()
-                for worker in workers:
-                    worker.cancel()
-                await asyncio.gather(*workers, return_exceptions=True)
-
-                successful_paths = [path for path in results_list if path]
-                if not successful_paths:
-                    logger.error(f"[{session_id_for_log}] 所有语音块都合成失败。")
-                    return None
-                
-                return successful_paths[0] if len(successful_paths) == 1 else await self._merge_wav_files(successful_paths)
+                return await self._collect_single(self._iter_pipeline_segments(
+                    self._iter_list(text_chunks), character_name, ref_audio_path, ref_audio_text,
+                    session_id_for_log, first_segment_chunks=0, max_workers=len(text_chunks), priority=priority,
+                    deadline=deadline,
+                ))
 
-        # 如果不切分，则使用轮询逻辑
+        # 如果不切分，则按调度器给出的顺序依次尝试
         logger.info(f"[{session_id_for_log}] 使用单块模式进行合成。")
-        start_index = self.tts_server_index
-        for i in range(len(servers)):
-            current_index = (start_index + i) % len(servers)
-            server_url = servers[current_index].strip("/")
-            
-            if i == 0:
-                self.tts_server_index = (start_index + 1) % len(servers)
+        try:
+            chunk = await deadline.run(self._synthesize_single(
+                servers, character_name, ref_audio_path, ref_audio_text, text, session_id_for_log, priority, deadline
+            ))
+        except asyncio.TimeoutError:
+            chunk = None
+        if chunk:
+            return await self._write_segment([chunk], session_id_for_log)
 
-            audio_path = await self._attempt_synthesis_on_server(
-                server_url=server_url, character_name=character_name,
-                ref_audio_path=ref_audio_path, ref_audio_text=ref_audio_text,
-                text=text, session_id_for_log=session_id_for_log,
-            )
-            if audio_path:
-                return audio_path
+        if deadline.expired():
+            logger.error(f"[{session_id_for_log}] 已到达回复截止时间，合成未完成。")
+        else:
+            logger.error(f"[{session_id_for_log}] 尝试所有TTS服务器后合成失败。")
+        return None
 
-        logger.error(f"[{session_id_for_log}] 尝试所有TTS服务器后合成失败。")
+    async def _synthesize_single(
+        self, servers: List[str], character_name: str, ref_audio_path: str, ref_audio_text: str, text: str,
+        session_id_for_log: str, priority: int, deadline: Deadline,
+    ) -> Optional[PcmChunk]:
+        """单块模式：获得准入名额后按调度器给出的顺序依次尝试服务器"""
+        wait_start = time.monotonic()
+        async with self.admission.permit(session_id_for_log, priority):
+            self.metrics.observe("admission_wait", time.monotonic() - wait_start)
+            for attempt, server_url in enumerate(self.scheduler.candidates(servers, len(text))):
+                if deadline.expired():
+                    break
+                if attempt:
+                    self.metrics.server(server_url).retries += 1
+                chunk = await self._attempt_synthesis_on_server(
+                    server_url=server_url, character_name=character_name,
+                    ref_audio_path=ref_audio_path, ref_audio_text=ref_audio_text,
+                    text=text, session_id_for_log=session_id_for_log, deadline=deadline,
+                )
+                if chunk:
+                    return chunk
         return None
\ No newline at end of file